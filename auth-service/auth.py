@@ -1,29 +1,77 @@
+import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Optional
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from models import User
 
-SECRET = "super-secret-change-me"
-ALGO = "HS256"
+SECRET = os.getenv("JWT_SECRET", "super-secret-change-me")
+# Для RS256/ES256 подписываем приватным ключом, а публичный раздаём сервисам,
+# чтобы они проверяли токены сами
+PRIVATE_KEY = os.getenv("JWT_PRIVATE_KEY")
+PUBLIC_KEY = os.getenv("JWT_PUBLIC_KEY")
+ALGO = os.getenv("JWT_ALGORITHM", "RS256" if PRIVATE_KEY else "HS256")
 ACCESS_EXPIRE_MINUTES = 60*24
 
+# Кэш пользователей для /me: id -> (истекает, пользователь).
+# Кэш у каждого воркера свой: /logout_all сбрасывает его только в своём воркере,
+# остальные принимают отозванные токены до USER_CACHE_TTL секунд
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "5"))
+_user_cache: OrderedDict = OrderedDict()
+
 security = HTTPBearer()
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET, algorithm=ALGO)
+    return jwt.encode(to_encode, PRIVATE_KEY or SECRET, algorithm=ALGO)
+
+def create_user_token(user: User):
+    # Токен несёт всё, что нужно /me и другим сервисам; ver позволяет отозвать
+    # все выданные токены пользователя, увеличив token_version
+    return create_access_token({
+        "sub": str(user.id),
+        "username": user.username,
+        "tin": user.tin,
+        "ver": user.token_version,
+    })
+
+def cache_user(user: User):
+    _user_cache[user.id] = (time.monotonic() + USER_CACHE_TTL, user)
+    _user_cache.move_to_end(user.id)
+    while len(_user_cache) > USER_CACHE_SIZE:
+        _user_cache.popitem(last=False)
+
+def invalidate_user(user_id: int):
+    _user_cache.pop(user_id, None)
+
+async def load_user(user_id: int) -> Optional[User]:
+    entry = _user_cache.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        _user_cache.move_to_end(user_id)
+        return entry[1]
+    user = await User.get_or_none(id=user_id)
+    if user is None:
+        invalidate_user(user_id)
+        return None
+    cache_user(user)
+    return user
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     try:
-        payload = jwt.decode(token, SECRET, algorithms=[ALGO])
+        payload = jwt.decode(token, PUBLIC_KEY or SECRET, algorithms=[ALGO])
         user_id = int(payload.get("sub"))
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user = await User.get_or_none(id=user_id)
+    user = await load_user(user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    if payload.get("ver", 0) != user.token_version:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
     return user
@@ -0,0 +1,91 @@
+"""
+Задержка /me до и во время шторма логинов.
+
+Запуск против работающего auth-service:
+
+    python bench_login_storm.py --url http://localhost:8001 --logins 200 --concurrency 50
+
+Если bcrypt считается в event loop, p99 /me во время шторма растёт
+до сотен миллисекунд; с пулом hashing.py он остаётся на уровне фона.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def percentiles(samples: list) -> dict:
+    ordered = sorted(samples)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pick(0.50), 2),
+        "p95_ms": round(pick(0.95), 2),
+        "p99_ms": round(pick(0.99), 2),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+    }
+
+
+async def probe_me(client: httpx.AsyncClient, token: str, stop: asyncio.Event, samples: list, interval: float):
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/me", headers=headers)
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def login_storm(client: httpx.AsyncClient, credentials: dict, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            response = await client.post("/login", json=credentials)
+            response.raise_for_status()
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+
+
+async def main(args):
+    credentials = {"username": f"bench-{uuid.uuid4().hex[:8]}", "password": "bench-password"}
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        (await client.post("/register", json=credentials)).raise_for_status()
+        token = (await client.post("/login", json=credentials)).json()["access_token"]
+
+        baseline = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_me(client, token, stop, baseline, args.interval))
+        await asyncio.sleep(args.warmup)
+        stop.set()
+        await probe
+
+        during = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_me(client, token, stop, during, args.interval))
+        started = time.perf_counter()
+        await login_storm(client, credentials, args.logins, args.concurrency)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+
+    print(f"/me без нагрузки:       {percentiles(baseline)}")
+    print(f"/me во время логинов:   {percentiles(during)}")
+    print(f"логины: {args.logins} за {elapsed:.2f} с ({args.logins / elapsed:.1f} RPS)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,36 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.hash import bcrypt
+
+# Стоимость bcrypt; при изменении старые хэши пересчитываются при входе
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Сколько хэшей считается одновременно; остальные ждут в очереди event loop.
+# bcrypt отпускает GIL, поэтому потоков достаточно
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_hasher = bcrypt.using(rounds=BCRYPT_ROUNDS)
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_semaphore = asyncio.Semaphore(HASH_WORKERS)
+
+
+async def _run(fn, *args):
+    async with _semaphore:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hasher.hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    return await _run(_hasher.verify, password, password_hash)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    return _hasher.needs_update(password_hash)
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
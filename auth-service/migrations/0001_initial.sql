@@ -0,0 +1,7 @@
+-- Схема на момент перехода на миграции (раньше создавалась generate_schemas)
+CREATE TABLE IF NOT EXISTS "user" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "username" VARCHAR(64) NOT NULL UNIQUE,
+    "password_hash" VARCHAR(128) NOT NULL,
+    "tin" VARCHAR(32)
+);
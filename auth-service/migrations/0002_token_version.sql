@@ -0,0 +1,2 @@
+-- Версия токенов пользователя для /logout_all
+ALTER TABLE "user" ADD COLUMN IF NOT EXISTS "token_version" INT NOT NULL DEFAULT 0;
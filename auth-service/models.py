@@ -1,20 +1,25 @@
 from tortoise import fields, models
-from passlib.hash import bcrypt
+from hashing import hash_password, needs_rehash, verify_password
 
 class User(models.Model):
     id = fields.IntField(pk=True)
     username = fields.CharField(64, unique=True)
     password_hash = fields.CharField(128)
     tin = fields.CharField(32, null=True)
+    # Увеличивается при отзыве всех токенов пользователя
+    token_version = fields.IntField(default=0)
 
     @classmethod
     async def create_user(cls, username: str, password: str, tin: str = None):
-        obj = await cls.create(username=username, password_hash=bcrypt.hash(password), tin=tin)
+        obj = await cls.create(username=username, password_hash=await hash_password(password), tin=tin)
         return obj
 
     @classmethod
     async def authenticate(cls, username: str, password: str):
         user = await cls.get_or_none(username=username)
-        if user and bcrypt.verify(password, user.password_hash):
+        if user and await verify_password(password, user.password_hash):
+            if needs_rehash(user.password_hash):
+                user.password_hash = await hash_password(password)
+                await user.save(update_fields=["password_hash"])
             return user
         return None
@@ -0,0 +1,139 @@
+"""
+Сводная таблица invoice_totals: число и сумма документов по месяцу,
+контрагенту, статусу, валюте и ставке НДС.
+
+Синхронизация поддерживает её в том же запросе, что и upsert документов
+(см. `ingest.upsert_invoices`). Полный пересчёт по месяцам, каждый
+в своей транзакции:
+
+    python aggregates.py --rebuild
+"""
+import argparse
+import asyncio
+
+import asyncpg
+
+from models import Invoice, InvoiceTotal
+
+
+# Измерения сводки: колонка invoice_totals -> выражение по строке invoices
+DIMENSIONS = {
+    "month": """date_trunc('month', "invoiceDate")::date""",
+    "contractor_id": '"contractor_id"',
+    "status_id": '"status_id"',
+    "currency_id": '"currency_id"',
+    "vatTaxType_id": '"vatTaxType_id"',
+}
+
+
+# Колонки invoices, из которых считаются измерения и сумма
+SOURCE_COLUMNS = ("invoiceDate", "totalAmount", "contractor_id", "status_id", "currency_id", "vatTaxType_id")
+
+
+def _dims() -> str:
+    return ", ".join(DIMENSIONS.values())
+
+
+def _key() -> str:
+    return ", ".join(f'"{column}"' for column in DIMENSIONS)
+
+
+def delta_ctes(new_rows: str, old_rows: str) -> str:
+    """
+    CTE, применяющие к сводке изменения одного запроса: `new_rows` —
+    записанные версии документов, `old_rows` — их прежние версии.
+    Оба источника должны содержать invoiceDate, totalAmount и колонки измерений.
+    """
+    table = InvoiceTotal._meta.db_table
+    key = _key()
+    return f"""
+    deltas AS (
+        SELECT {_dims()}, 1 AS "count", "totalAmount" FROM {new_rows}
+        UNION ALL
+        SELECT {_dims()}, -1, -"totalAmount" FROM {old_rows}
+    ),
+    totals AS (
+        INSERT INTO "{table}" ({key}, "count", "totalAmount")
+        SELECT * FROM (
+            SELECT {key}, sum("count") AS "count", sum("totalAmount") AS "totalAmount"
+            FROM deltas AS d ({key}, "count", "totalAmount")
+            GROUP BY {key}
+            HAVING sum("count") <> 0 OR sum("totalAmount") <> 0
+        ) AS grouped
+        -- Один порядок обновления строк сводки у всех писателей: без взаимных блокировок
+        ORDER BY {key}
+        ON CONFLICT ({key}) DO UPDATE
+        SET "count" = "{table}"."count" + EXCLUDED."count",
+            "totalAmount" = "{table}"."totalAmount" + EXCLUDED."totalAmount"
+    )"""
+
+
+async def _months(connection) -> list:
+    """Месяцы для пересчёта: от первого до последнего документа, уже известные сводке и NULL."""
+    table = InvoiceTotal._meta.db_table
+    source = Invoice._meta.db_table
+    rows = await connection.fetch(
+        f"""
+        SELECT generate_series(
+            date_trunc('month', min("invoiceDate")), max("invoiceDate"), interval '1 month'
+        )::date AS "month" FROM "{source}"
+        UNION SELECT DISTINCT "month" FROM "{table}"
+        UNION SELECT NULL::date
+        ORDER BY 1 NULLS FIRST
+        """
+    )
+    return [row["month"] for row in rows]
+
+
+async def rebuild_month(connection, month) -> int:
+    """
+    Пересчитывает строки сводки за один месяц (None — документы без даты).
+    Запись документов блокируется только на время этого месяца: дельты,
+    записанные до или после, относятся к уже согласованному состоянию.
+    """
+    table = InvoiceTotal._meta.db_table
+    source = Invoice._meta.db_table
+    if month is None:
+        condition, values = '"invoiceDate" IS NULL', []
+    else:
+        condition, values = """"invoiceDate" >= $1 AND "invoiceDate" < $1 + interval '1 month'""", [month]
+    async with connection.transaction():
+        await connection.execute(f'LOCK TABLE "{source}" IN SHARE MODE')
+        await connection.execute(f'DELETE FROM "{table}" WHERE "month" IS NOT DISTINCT FROM $1::date', month)
+        status = await connection.execute(
+            f"""
+            INSERT INTO "{table}" ({_key()}, "count", "totalAmount")
+            SELECT {_dims()}, count(*), sum("totalAmount")
+            FROM "{source}"
+            WHERE {condition}
+            GROUP BY {_dims()}
+            """,
+            *values,
+        )
+    return int(status.split()[-1])
+
+
+async def rebuild(connection) -> int:
+    """Пересчитывает сводку по всем документам, месяц за месяцем; возвращает число строк."""
+    total = 0
+    for month in await _months(connection):
+        total += await rebuild_month(connection, month)
+    return total
+
+
+async def _main(args):
+    from db import DATABASE_URL
+
+    # Отдельное соединение без command_timeout пула сервиса, как в migrate.py
+    connection = await asyncpg.connect(DATABASE_URL)
+    try:
+        if args.rebuild:
+            print(f"сводка пересчитана: {await rebuild(connection)} строк")
+    finally:
+        await connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать invoice_totals по таблице invoices")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,87 @@
+"""
+Проверка и заполнение сумм catalogEntries на больших документах.
+
+    python bench_catalog.py --lines 10000 --repeat 20
+
+Ставка НДС задаётся явно, справочник и БД не нужны.
+"""
+import argparse
+import json
+import statistics
+import time
+from decimal import Decimal
+
+import catalog
+from catalog import compute_totals
+from schemas import InvoiceData
+
+
+def make_invoice(lines: int, without_taxes: bool, filled: bool) -> dict:
+    entries = []
+    for i in range(lines):
+        entry = {
+            "id": i + 1,
+            "unitClassificationCode": "796",
+            "salesTaxCode": "ST2" if i % 2 else "ST0",
+            "quantity": str(1 + i % 7),
+            "price": f"{10 + (i * 37) % 1000}.{i % 100:02d}",
+        }
+        entries.append(entry)
+    data = {
+        "isBranchDataSent": False,
+        "isPriceWithoutTaxes": without_taxes,
+        "operationTypeCode": "10",
+        "deliveryDate": "2024-03-01",
+        "deliveryTypeCode": "1",
+        "isResident": True,
+        "contractorTin": "01234567890123",
+        "currencyCode": "417",
+        "deliveryCode": "1",
+        "paymentCode": "10",
+        "taxRateVATCode": "VAT12",
+        "catalogEntries": entries,
+    }
+    if filled:
+        # Документ с уже верными суммами, как от аккуратного клиента
+        _, invoice = compute_totals(InvoiceData.model_validate(data), Decimal(12), fill=True)
+        data = json.loads(invoice.model_dump_json())
+    return data
+
+
+def measure(fn, repeat: int) -> dict:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return {"median_ms": round(statistics.median(samples) * 1000, 2), "min_ms": round(min(samples) * 1000, 2)}
+
+
+def main(args):
+    catalog.SALES_TAX_RATES = {"ST0": Decimal(0), "ST2": Decimal(2)}
+    vat = Decimal(12)
+    results = {}
+    for without_taxes in (True, False):
+        label = "без налогов" if without_taxes else "с налогами"
+        raw = json.dumps(make_invoice(args.lines, without_taxes, filled=True)).encode()
+        bare = json.dumps(make_invoice(args.lines, without_taxes, filled=False)).encode()
+        invoice = InvoiceData.model_validate_json(raw)
+        assert not compute_totals(invoice, vat, fill=False)[0]
+        results[f"цена {label}: разбор InvoiceData"] = measure(lambda: InvoiceData.model_validate_json(raw), args.repeat)
+        results[f"цена {label}: проверка сумм"] = measure(lambda: compute_totals(invoice, vat, fill=False), args.repeat)
+        results[f"цена {label}: разбор + заполнение сумм"] = measure(
+            lambda: compute_totals(InvoiceData.model_validate_json(bare), vat, fill=True), args.repeat
+        )
+        results[f"цена {label}: сериализация для ГНС"] = measure(lambda: invoice.model_dump_json(), args.repeat)
+    print(f"позиций: {args.lines}")
+    width = max(map(len, results))
+    for name, result in results.items():
+        print(f"{name:<{width}}  {result}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,95 @@
+"""
+Разбор ответа ГНС и сериализация ответов на странице из 1000 документов.
+
+    python bench_json.py --invoices 1000 --repeat 20
+
+Сравнивает старый путь (response.json() -> dict -> InvoicesResponse(**data),
+стандартный кодировщик FastAPI) с разбором из байтов и orjson.
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from schemas import InvoiceDetailOut, InvoiceOut, InvoicesPage, InvoicesResponse
+
+
+def make_invoice(i: int) -> dict:
+    def code_name(prefix):
+        return {"code": f"{prefix}{i % 5}", "name": f"Справочник {prefix} {i % 5}"}
+
+    def person(prefix):
+        return {"pin": f"{prefix}{i % 300:014d}", "fullName": f"ОсОО «Организация {i % 300}»", "mainFullName": None, "mainPin": None}
+
+    return {
+        "documentUuid": str(uuid.UUID(int=i + 1)),
+        "totalAmount": round(1000 + i * 13.37, 2),
+        "createdDate": "2024-03-01",
+        "deliveryDate": "2024-03-02",
+        "invoiceDate": "2024-03-01",
+        "ownedCrmReceiptCode": f"CRM-{i}",
+        "invoiceNumber": f"INV-{i:06d}",
+        "number": f"{i:08d}",
+        "note": "Поставка товаров по договору" if i % 3 else None,
+        "correctedReceiptUuid": None,
+        "isResident": "true",
+        "paymentType": code_name("P"),
+        "currency": code_name("C"),
+        "status": code_name("S"),
+        "receiptType": code_name("R"),
+        "deliveryType": code_name("D"),
+        "legalPerson": person("1"),
+        "contractor": person("2"),
+        "vatTaxType": {"rate": "12.00", "name": "НДС 12%", "code": "VAT12"},
+    }
+
+
+def measure(fn, repeat: int) -> dict:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return {"median_ms": round(statistics.median(samples) * 1000, 2), "min_ms": round(min(samples) * 1000, 2)}
+
+
+def main(args):
+    invoices = [make_invoice(i) for i in range(args.invoices)]
+    raw = json.dumps({"invoices": invoices, "totalElements": len(invoices), "totalPage": 1}).encode()
+    adapter = TypeAdapter(InvoicesResponse)
+
+    parsed = InvoicesResponse.model_validate_json(raw)
+    details = [
+        InvoiceDetailOut.model_validate({**inv.model_dump(), "id": i, "totalAmount": Decimal(str(inv.totalAmount)), "isResident": True})
+        for i, inv in enumerate(parsed.invoices)
+    ]
+    page = InvoicesPage(items=[InvoiceOut.model_validate(detail.model_dump()) for detail in details])
+
+    results = {
+        "parse: json.loads + InvoicesResponse(**data)": measure(lambda: InvoicesResponse(**json.loads(raw)), args.repeat),
+        "parse: model_validate_json(bytes)": measure(lambda: InvoicesResponse.model_validate_json(raw), args.repeat),
+        "parse: TypeAdapter.validate_json(bytes)": measure(lambda: adapter.validate_json(raw), args.repeat),
+        "detail x N: jsonable_encoder + json.dumps": measure(lambda: [json.dumps(jsonable_encoder(d)) for d in details], args.repeat),
+        "detail x N: jsonable_encoder + orjson": measure(lambda: [orjson.dumps(jsonable_encoder(d)) for d in details], args.repeat),
+        "detail x N: model_dump_json": measure(lambda: [d.model_dump_json() for d in details], args.repeat),
+        "list page: jsonable_encoder + json.dumps": measure(lambda: json.dumps(jsonable_encoder(page)), args.repeat),
+        "list page: model_dump_json": measure(lambda: page.model_dump_json(), args.repeat),
+    }
+    print(f"документов: {args.invoices}, ответ ГНС: {len(raw) / 1024:.0f} КБ")
+    width = max(map(len, results))
+    for name, result in results.items():
+        print(f"{name:<{width}}  {result}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,160 @@
+import os
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from models import VatTaxType
+from refcache import ref_cache
+from schemas import InvoiceData
+
+
+# reject — расхождения в суммах отклоняются до отправки в ГНС,
+# fill — суммы позиций и документа заполняются расчётными, off — без проверки
+CATALOG_TOTALS = os.getenv("CATALOG_TOTALS", "reject")
+# Допустимое расхождение с расчётом на одну сумму
+CATALOG_TOLERANCE = Decimal(os.getenv("CATALOG_TOLERANCE", "0.01"))
+# Сколько расхождений перечислять в ответе
+CATALOG_MAX_ERRORS = int(os.getenv("CATALOG_MAX_ERRORS", "20"))
+# С какого числа позиций расчёт уходит в пул потоков, чтобы не занимать event loop
+CATALOG_THREADPOOL_LINES = int(os.getenv("CATALOG_THREADPOOL_LINES", "1000"))
+
+
+def parse_rates(value: str) -> dict:
+    """`code:rate,code:rate` -> {code: Decimal(rate)}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        code, _, rate = item.partition(":")
+        rates[code.strip()] = Decimal(rate.strip())
+    return rates
+
+
+# Ставки в процентах. НДС берётся из справочника VatTaxType, VAT_RATES его дополняет;
+# ставок налога с продаж в справочниках нет, только из окружения
+VAT_RATES = parse_rates(os.getenv("VAT_RATES", ""))
+SALES_TAX_RATES = parse_rates(os.getenv("SALES_TAX_RATES", ""))
+
+CENT = Decimal("0.01")
+HUNDRED = Decimal(100)
+ZERO = Decimal(0)
+LINE_FIELDS = ("amountWithoutTaxes", "vatAmount", "salesTaxAmount", "totalAmount")
+
+# Коды НДС, о которых уже написали в лог: по одному сообщению на код
+_unknown_vat_codes: set = set()
+
+
+async def vat_rate(code: str) -> Optional[Decimal]:
+    if code in VAT_RATES:
+        return VAT_RATES[code]
+    row = await ref_cache.get(VatTaxType, "code", code)
+    return row["rate"] if row is not None else None
+
+
+def compute_totals(data: InvoiceData, vat: Decimal, fill: bool) -> Tuple[List[str], InvoiceData]:
+    """
+    Один проход по позициям: сумма без налогов, НДС, налог с продаж
+    и итог каждой строки, затем итоги документа. Всё в Decimal
+    с округлением до копейки половиной вверх.
+
+    Цена с налогами (`isPriceWithoutTaxes` = false) раскладывается обратно:
+    база = итог / (1 + ставки), остаток от округления уходит в НДС.
+    Если ставка налога с продаж неизвестна, берётся присланная сумма налога.
+
+    Возвращает расхождения и документ; с `fill` расхождений нет,
+    а документ — копия с расчётными суммами. Исходный не меняется.
+    """
+    errors: List[str] = []
+    entries = []
+    tolerance = CATALOG_TOLERANCE
+    without_taxes = data.isPriceWithoutTaxes
+    vat_share = vat / HUNDRED
+    sum_without = sum_total = ZERO
+
+    def mismatch(where: str, field: str, actual: Decimal, expected: Decimal):
+        if len(errors) < CATALOG_MAX_ERRORS:
+            errors.append(f"{where}: {field} = {actual}, по расчёту {expected}")
+        else:
+            errors.append("")
+
+    for index, entry in enumerate(data.catalogEntries):
+        sales_rate = SALES_TAX_RATES.get(entry.salesTaxCode)
+        gross = (entry.quantity * entry.price).quantize(CENT, ROUND_HALF_UP)
+        if without_taxes:
+            base = gross
+            vat_amount = (base * vat_share).quantize(CENT, ROUND_HALF_UP)
+            if sales_rate is None:
+                sales_amount = entry.salesTaxAmount or ZERO
+            else:
+                sales_amount = (base * sales_rate / HUNDRED).quantize(CENT, ROUND_HALF_UP)
+            total = base + vat_amount + sales_amount
+        else:
+            total = gross
+            if sales_rate is None:
+                sales_amount = entry.salesTaxAmount or ZERO
+                base = ((total - sales_amount) / (1 + vat_share)).quantize(CENT, ROUND_HALF_UP)
+                vat_amount = total - sales_amount - base
+            else:
+                base = (total / (1 + vat_share + sales_rate / HUNDRED)).quantize(CENT, ROUND_HALF_UP)
+                sales_amount = (base * sales_rate / HUNDRED).quantize(CENT, ROUND_HALF_UP)
+                vat_amount = total - base - sales_amount
+        sum_without += base
+        sum_total += total
+
+        if fill:
+            entries.append(entry.model_copy(update={
+                "amountWithoutTaxes": base,
+                "vatAmount": vat_amount,
+                "salesTaxAmount": sales_amount,
+                "totalAmount": total,
+            }))
+            continue
+        for field, expected in zip(LINE_FIELDS, (base, vat_amount, sales_amount, total)):
+            actual = getattr(entry, field)
+            if actual is not None and abs(actual - expected) > tolerance:
+                mismatch(f"позиция {index} (id {entry.id})", field, actual, expected)
+
+    if fill:
+        return errors, data.model_copy(update={
+            "catalogEntries": entries,
+            "totalCurrencyValueWithoutTaxes": sum_without,
+            "totalCurrencyValue": sum_total,
+        })
+    for field, expected in (("totalCurrencyValueWithoutTaxes", sum_without), ("totalCurrencyValue", sum_total)):
+        actual = getattr(data, field)
+        if actual is not None and abs(actual - expected) > tolerance:
+            mismatch("документ", field, actual, expected)
+    return errors, data
+
+
+async def check_catalog(data: InvoiceData, mode: str = CATALOG_TOTALS) -> InvoiceData:
+    """
+    Проверяет суммы позиций и документа до отправки в ГНС:
+    расхождение стоило бы запроса в ГНС и отказа.
+    Возвращает документ для отправки (в режиме fill — с расчётными суммами).
+    """
+    if mode == "off" or not data.catalogEntries:
+        return data
+    vat = await vat_rate(data.taxRateVATCode)
+    if vat is None:
+        # Без ставки НДС пересчитать нельзя; решение остаётся за ГНС
+        if data.taxRateVATCode not in _unknown_vat_codes:
+            _unknown_vat_codes.add(data.taxRateVATCode)
+            print(f"Проверка сумм пропущена: неизвестная ставка НДС {data.taxRateVATCode}")
+        return data
+    fill = mode == "fill"
+    try:
+        if len(data.catalogEntries) >= CATALOG_THREADPOOL_LINES:
+            errors, data = await run_in_threadpool(compute_totals, data, vat, fill)
+        else:
+            errors, data = compute_totals(data, vat, fill)
+    except InvalidOperation:
+        raise HTTPException(status_code=422, detail="Некорректные количество или цена в catalogEntries")
+    if errors:
+        shown = [error for error in errors if error]
+        hidden = len(errors) - len(shown)
+        detail = "Суммы не сходятся с расчётом: " + "; ".join(shown)
+        if hidden:
+            detail += f"; и ещё {hidden}"
+        raise HTTPException(status_code=422, detail=detail)
+    return data
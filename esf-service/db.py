@@ -0,0 +1,72 @@
+import asyncio
+import os
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from tortoise import Tortoise
+from tortoise.backends.base.config_generator import expand_db_url
+
+import migrate
+
+
+DATABASE_URL = migrate.DATABASE_URL
+# Пул asyncpg на один воркер: при N воркерах к БД идёт до N * DB_POOL_MAX соединений
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+DB_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_LIFETIME", "300"))
+# Только для разработки: схема обычно создаётся `python migrate.py`
+DB_GENERATE_SCHEMAS = os.getenv("DB_GENERATE_SCHEMAS", "false").lower() == "true"
+DB_READY_TIMEOUT = float(os.getenv("DB_READY_TIMEOUT", "2"))
+
+
+def tortoise_config(models: List[str]) -> dict:
+    connection = expand_db_url(DATABASE_URL)
+    connection["credentials"].update(
+        minsize=DB_POOL_MIN,
+        maxsize=DB_POOL_MAX,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        command_timeout=DB_COMMAND_TIMEOUT,
+        max_inactive_connection_lifetime=DB_MAX_INACTIVE_LIFETIME,
+    )
+    return {
+        "connections": {"default": connection},
+        "apps": {"models": {"models": models, "default_connection": "default"}},
+    }
+
+
+async def readiness() -> dict:
+    client = Tortoise.get_connection("default")
+    pool = client._pool
+    report = {"ready": False, "database": "unavailable"}
+    if pool is not None:
+        report["pool"] = {
+            "size": pool.get_size(),
+            "idle": pool.get_idle_size(),
+            "min": pool.get_min_size(),
+            "max": pool.get_max_size(),
+        }
+    try:
+        async with asyncio.timeout(DB_READY_TIMEOUT):
+            async with client.acquire_connection() as connection:
+                report["database"] = "ok"
+                report["pendingMigrations"] = await migrate.pending(connection)
+    except Exception as exc:
+        report["error"] = str(exc) or type(exc).__name__
+        return report
+    report["ready"] = not report["pendingMigrations"] or DB_GENERATE_SCHEMAS
+    return report
+
+
+def add_health_routes(app: FastAPI):
+    @app.get("/health/live", include_in_schema=False)
+    async def live():
+        return {"status": "ok"}
+
+    @app.get("/health/ready", include_in_schema=False)
+    async def ready():
+        """503, пока БД недоступна, пул исчерпан дольше DB_READY_TIMEOUT или есть непримененные миграции."""
+        report = await readiness()
+        return ORJSONResponse(report, status_code=200 if report["ready"] else 503)
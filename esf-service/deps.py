@@ -1,19 +1,122 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import jwt, JWTError
 import httpx
 import os
+import time
+
+from metrics import observe_upstream
 
 security = HTTPBearer()
 AUTH_SERVICE = os.getenv("AUTH_SERVICE", "http://auth-service:8001")
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", "5"))
+AUTH_MAX_CONNECTIONS = int(os.getenv("AUTH_MAX_CONNECTIONS", "50"))
+AUTH_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AUTH_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+# Проверка подписи токена без похода в auth-service:
+# общий секрет (HS256) или опубликованный публичный ключ (RS256/ES256)
+JWT_SECRET = os.getenv("JWT_SECRET", "super-secret-change-me")
+JWT_PUBLIC_KEY = os.getenv("JWT_PUBLIC_KEY")
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "RS256" if JWT_PUBLIC_KEY else "HS256")
+
+# Сколько секунд доверяем ответу /me для проверок, чувствительных к отзыву
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+_auth_client: Optional[httpx.AsyncClient] = None
+# token -> (истекает, пользователь)
+_user_cache: dict = {}
+
+
+async def start_auth_client():
+    global _auth_client
+    if _auth_client is None:
+        _auth_client = httpx.AsyncClient(
+            base_url=AUTH_SERVICE,
+            limits=httpx.Limits(
+                max_connections=AUTH_MAX_CONNECTIONS,
+                max_keepalive_connections=AUTH_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            timeout=AUTH_TIMEOUT,
+        )
+
+
+async def close_auth_client():
+    global _auth_client
+    if _auth_client is not None:
+        await _auth_client.aclose()
+        _auth_client = None
+
+
+def decode_token(token: str) -> dict:
+    try:
+        payload = jwt.decode(token, JWT_PUBLIC_KEY or JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        int(payload.get("sub"))
+    except (JWTError, TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid token")
+    return payload
+
+
+def user_from_claims(payload: dict) -> dict:
+    return {"id": int(payload["sub"]), "username": payload.get("username"), "tin": payload.get("tin")}
+
+
+def _cache_get(token: str) -> Optional[dict]:
+    entry = _user_cache.get(token)
+    if entry is None:
+        return None
+    expires, user = entry
+    if expires < time.monotonic():
+        _user_cache.pop(token, None)
+        return None
+    return user
+
+
+def _cache_put(token: str, user: dict, payload: dict):
+    if len(_user_cache) >= AUTH_CACHE_SIZE:
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in _user_cache.items() if expires < now]:
+            del _user_cache[key]
+        while len(_user_cache) >= AUTH_CACHE_SIZE:
+            _user_cache.pop(next(iter(_user_cache)))
+    # Не держим в кэше дольше, чем живёт сам токен
+    expires = time.monotonic() + min(AUTH_CACHE_TTL, max(payload.get("exp", 0) - time.time(), 0))
+    _user_cache[token] = (expires, user)
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Пользователь из локально проверенного токена, без сетевых вызовов."""
+    return user_from_claims(decode_token(credentials.credentials))
+
 
 async def get_current_user_from_auth_service(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """
+    Проверка, чувствительная к отзыву токена.
+
+    Подпись и срок проверяются локально, затем ответ auth-service /me
+    берётся из кэша на `AUTH_CACHE_TTL` секунд. Если auth-service
+    недоступен, используются данные из самого токена.
+    """
     token = credentials.credentials
+    payload = decode_token(token)
+    user = _cache_get(token)
+    if user is not None:
+        return user
+
     headers = {"Authorization": f"Bearer {token}"}
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(f"{AUTH_SERVICE}/me", headers=headers, timeout=5.0)
-            if resp.status_code != 200:
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid token")
-            return resp.json()
-        except httpx.RequestError:
-            raise HTTPException(status_code=503, detail="Auth service unavailable")
+    try:
+        if _auth_client is None:
+            raise httpx.ConnectError("auth client is not started")
+        with observe_upstream("auth", "me") as outcome:
+            resp = await _auth_client.get("/me", headers=headers)
+            outcome["value"] = str(resp.status_code)
+    except httpx.RequestError:
+        return user_from_claims(payload)
+    if resp.status_code == status.HTTP_401_UNAUTHORIZED:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid token")
+    if resp.status_code != 200:
+        return user_from_claims(payload)
+    user = resp.json()
+    _cache_put(token, user, payload)
+    return user
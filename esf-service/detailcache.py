@@ -0,0 +1,75 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+
+DETAIL_CACHE_SIZE = int(os.getenv("DETAIL_CACHE_SIZE", "5000"))
+# Инвалидация работает только внутри воркера; TTL ограничивает,
+# насколько устаревшим может быть ответ, если документ обновил другой воркер
+DETAIL_CACHE_TTL = float(os.getenv("DETAIL_CACHE_TTL", "60"))
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Слабое сравнение: W/"x" совпадает с "x"
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class DetailCache:
+    """
+    Готовые ответы /invoices/{id}: id -> (ETag, JSON, срок).
+
+    `version` растёт при каждой инвалидации: ответ, прочитанный из БД
+    до неё, в кэш уже не попадёт.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self._entries: OrderedDict = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "invalidated": 0}
+
+    def get(self, invoice_id: int) -> Optional[Tuple[str, bytes]]:
+        entry = self._entries.get(invoice_id)
+        if entry is None or entry[2] < time.monotonic():
+            if entry is not None:
+                del self._entries[invoice_id]
+            self.counters["misses"] += 1
+            return None
+        self._entries.move_to_end(invoice_id)
+        self.counters["hits"] += 1
+        return entry[0], entry[1]
+
+    def put(self, invoice_id: int, body: bytes, version: int) -> str:
+        etag = make_etag(body)
+        if version == self.version:
+            self._entries[invoice_id] = (etag, body, time.monotonic() + self.ttl)
+            self._entries.move_to_end(invoice_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return etag
+
+    def invalidate(self, ids: Iterable[int]):
+        self.version += 1
+        for invoice_id in ids:
+            if self._entries.pop(invoice_id, None) is not None:
+                self.counters["invalidated"] += 1
+
+    def clear(self):
+        self.version += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), **self.counters}
+
+
+detail_cache = DetailCache(DETAIL_CACHE_SIZE, DETAIL_CACHE_TTL)
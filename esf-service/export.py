@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date
+from typing import AsyncIterator, Optional
+
+from tortoise import Tortoise
+
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+
+EXPORT_COLUMNS = {
+    "id": 'i."id"',
+    "documentUuid": 'i."documentUuid"',
+    "totalAmount": 'i."totalAmount"',
+    "createdDate": 'i."createdDate"',
+    "deliveryDate": 'i."deliveryDate"',
+    "invoiceDate": 'i."invoiceDate"',
+    "ownedCrmReceiptCode": 'i."ownedCrmReceiptCode"',
+    "invoiceNumber": 'i."invoiceNumber"',
+    "number": 'i."number"',
+    "note": 'i."note"',
+    "correctedReceiptUuid": 'i."correctedReceiptUuid"',
+    "isResident": 'i."isResident"',
+    "paymentType": 'pt."name"',
+    "currency": 'cur."code"',
+    "status": 'st."name"',
+    "receiptType": 'rt."name"',
+    "deliveryType": 'dt."name"',
+    "legalPersonPin": 'lp."pin"',
+    "legalPerson": 'lp."fullName"',
+    "contractorPin": 'c."pin"',
+    "contractor": 'c."fullName"',
+    "vatTaxType": 'v."name"',
+    "vatRate": 'v."rate"',
+}
+
+EXPORT_JOINS = """
+    LEFT JOIN "paymenttype" pt ON pt."id" = i."paymentType_id"
+    LEFT JOIN "currency" cur ON cur."id" = i."currency_id"
+    LEFT JOIN "status" st ON st."id" = i."status_id"
+    LEFT JOIN "receipttype" rt ON rt."id" = i."receiptType_id"
+    LEFT JOIN "deliverytype" dt ON dt."id" = i."deliveryType_id"
+    LEFT JOIN "legalperson" lp ON lp."id" = i."legalPerson_id"
+    LEFT JOIN "contractor" c ON c."id" = i."contractor_id"
+    LEFT JOIN "vattaxtype" v ON v."id" = i."vatTaxType_id"
+"""
+
+
+def build_query(
+    status: Optional[str] = None,
+    contractorPin: Optional[str] = None,
+    currency: Optional[str] = None,
+    dateFrom: Optional[date] = None,
+    dateTo: Optional[date] = None,
+):
+    conditions = []
+    values = []
+    for column, value in (
+        ('st."code" = ', status),
+        ('c."pin" = ', contractorPin),
+        ('cur."code" = ', currency),
+        ('i."invoiceDate" >= ', dateFrom),
+        ('i."invoiceDate" <= ', dateTo),
+    ):
+        if value is not None:
+            values.append(value)
+            conditions.append(f"{column}${len(values)}")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    columns = ", ".join(f'{expr} AS "{name}"' for name, expr in EXPORT_COLUMNS.items())
+    query = f'SELECT {columns} FROM "invoices" i {EXPORT_JOINS} {where} ORDER BY i."id"'
+    return query, values
+
+
+async def iter_chunks(query: str, values: list) -> AsyncIterator[list]:
+    """
+    Читает выборку серверным курсором пачками по `EXPORT_CHUNK_SIZE`,
+    в памяти одновременно лежит только одна пачка.
+    """
+    client = Tortoise.get_connection("default")
+    async with client.acquire_connection() as connection:
+        async with connection.transaction(readonly=True):
+            cursor = await connection.cursor(query, *values)
+            while True:
+                rows = await cursor.fetch(EXPORT_CHUNK_SIZE)
+                if not rows:
+                    break
+                yield rows
+
+
+def _ndjson(rows) -> bytes:
+    return "".join(json.dumps(dict(row), default=str, ensure_ascii=False) + "\n" for row in rows).encode()
+
+
+def _csv(rows, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def stream_export(query: str, values: list, fmt: str, gzip: bool) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    if fmt == "csv":
+        # BOM, чтобы Excel открыл кириллицу в UTF-8
+        head = "\ufeff".encode() + _csv([], header=True)
+        yield compressor.compress(head) if compressor else head
+    async for rows in iter_chunks(query, values):
+        body = _csv(rows, header=False) if fmt == "csv" else _ndjson(rows)
+        if compressor:
+            body = compressor.compress(body)
+            if not body:
+                continue
+        yield body
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,233 @@
+import asyncio
+import os
+from datetime import date
+from typing import Optional, Union
+from urllib.parse import urljoin
+
+import httpx
+from fastapi import HTTPException
+
+from metrics import observe_upstream
+from resilience import CircuitBreaker, RetryBudget, jittered_backoff
+
+
+GNS_PROXY = os.getenv("GNS_PROXY")
+X_ROAD = os.getenv("X-Road-Client")
+ClientUUID = os.getenv("ClientUUID")
+Authorization = os.getenv("Authorization")
+TIN = os.getenv("USER-TIN")
+
+
+create_url = urljoin(GNS_PROXY, os.getenv("CREATE_PATH"))
+get_url = urljoin(GNS_PROXY, os.getenv("GET_PATH"))
+update_url = urljoin(GNS_PROXY, os.getenv("UPDATE_PATH"))
+delete_url = urljoin(GNS_PROXY, os.getenv("DELETE_PATH"))
+
+# Имена параметров постраничной выдачи в GET_PATH
+GNS_PAGE_PARAM = os.getenv("GNS_PAGE_PARAM", "page")
+GNS_SIZE_PARAM = os.getenv("GNS_SIZE_PARAM", "size")
+# Параметр «документы, созданные начиная с даты» для инкрементальной синхронизации
+GNS_SINCE_PARAM = os.getenv("GNS_SINCE_PARAM", "createdDateFrom")
+
+
+# Настройки пула соединений к ГНС/X-Road
+GNS_MAX_CONNECTIONS = int(os.getenv("GNS_MAX_CONNECTIONS", "100"))
+GNS_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GNS_MAX_KEEPALIVE_CONNECTIONS", "20"))
+GNS_KEEPALIVE_EXPIRY = float(os.getenv("GNS_KEEPALIVE_EXPIRY", "30"))
+GNS_HTTP2 = os.getenv("GNS_HTTP2", "false").lower() == "true"
+GNS_CONNECT_TIMEOUT = float(os.getenv("GNS_CONNECT_TIMEOUT", "5"))
+
+# Таймауты на чтение ответа по каждой операции
+GNS_TIMEOUTS = {
+    "get": float(os.getenv("GNS_GET_TIMEOUT", "30")),
+    "create": float(os.getenv("GNS_CREATE_TIMEOUT", "15")),
+    "update": float(os.getenv("GNS_UPDATE_TIMEOUT", "15")),
+    "delete": float(os.getenv("GNS_DELETE_TIMEOUT", "10")),
+}
+
+# Повторы только для идемпотентных операций и в пределах бюджета
+GNS_IDEMPOTENT_OPERATIONS = {"get", "delete"}
+GNS_RETRY_ATTEMPTS = int(os.getenv("GNS_RETRY_ATTEMPTS", "3"))
+GNS_RETRY_BACKOFF_BASE = float(os.getenv("GNS_RETRY_BACKOFF_BASE", "0.2"))
+GNS_RETRY_BACKOFF_MAX = float(os.getenv("GNS_RETRY_BACKOFF_MAX", "2"))
+GNS_RETRY_BUDGET_RATIO = float(os.getenv("GNS_RETRY_BUDGET_RATIO", "0.2"))
+GNS_RETRY_BUDGET_RESERVE = float(os.getenv("GNS_RETRY_BUDGET_RESERVE", "10"))
+
+GNS_BREAKER_FAILURES = int(os.getenv("GNS_BREAKER_FAILURES", "5"))
+GNS_BREAKER_RESET = float(os.getenv("GNS_BREAKER_RESET", "30"))
+
+# Через сколько секунд без ответа на GET отправить дублирующий запрос; 0 — выключено
+GNS_HEDGE_DELAY = float(os.getenv("GNS_HEDGE_DELAY", "0"))
+GNS_HEDGED_OPERATIONS = {"get"}
+
+
+class GNSClient:
+    """
+    Общий клиент ГНС на время жизни приложения.
+
+    Держит один `httpx.AsyncClient` с keep-alive пулом, чтобы запросы
+    не платили за TCP/TLS рукопожатие каждый раз.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breakers = {
+            operation: CircuitBreaker(operation, GNS_BREAKER_FAILURES, GNS_BREAKER_RESET)
+            for operation in GNS_TIMEOUTS
+        }
+        self.retry_budget = RetryBudget(GNS_RETRY_BUDGET_RATIO, GNS_RETRY_BUDGET_RESERVE)
+        self.hedging = {"hedged": 0, "hedgeWins": 0}
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "X-Road-Client": X_ROAD,
+            "ClientUUID": ClientUUID,
+            "Authorization": Authorization,
+            "USER-TIN": TIN,
+            "Content-Type": "application/json"
+        }
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("GNS клиент не запущен")
+        return self._client
+
+    async def start(self):
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            headers={k: v for k, v in self.headers.items() if v is not None},
+            limits=httpx.Limits(
+                max_connections=GNS_MAX_CONNECTIONS,
+                max_keepalive_connections=GNS_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=GNS_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(GNS_TIMEOUTS["get"], connect=GNS_CONNECT_TIMEOUT),
+            http2=GNS_HTTP2,
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _send(self, operation: str, method: str, url: str, **kwargs) -> httpx.Response:
+        if operation not in GNS_HEDGED_OPERATIONS or GNS_HEDGE_DELAY <= 0:
+            return await self.client.request(method, url, **kwargs)
+
+        first = asyncio.ensure_future(self.client.request(method, url, **kwargs))
+        done, _ = await asyncio.wait({first}, timeout=GNS_HEDGE_DELAY)
+        if done or not self.retry_budget.withdraw():
+            return await first
+
+        self.hedging["hedged"] += 1
+        second = asyncio.ensure_future(self.client.request(method, url, **kwargs))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code < 500:
+                        if task is second:
+                            self.hedging["hedgeWins"] += 1
+                        return task.result()
+            # Оба запроса неудачны: отдаём результат последнего
+            return await task
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def request(self, operation: str, method: str, url: str, **kwargs) -> httpx.Response:
+        breaker = self.breakers[operation]
+        if not breaker.allow():
+            raise HTTPException(
+                status_code=503,
+                detail=f"Внешний сервис временно недоступен: операция {operation} приостановлена после серии ошибок",
+                headers={"Retry-After": str(breaker.retry_after())},
+            )
+        self.retry_budget.deposit()
+        timeout = httpx.Timeout(GNS_TIMEOUTS[operation], connect=GNS_CONNECT_TIMEOUT)
+        attempts = GNS_RETRY_ATTEMPTS if operation in GNS_IDEMPOTENT_OPERATIONS else 1
+
+        attempt = 0
+        while True:
+            try:
+                with observe_upstream("gns", operation) as outcome:
+                    try:
+                        response = await self._send(operation, method, url, timeout=timeout, **kwargs)
+                    except httpx.RequestError as exc:
+                        outcome["value"] = type(exc).__name__
+                        response = None
+                        error = HTTPException(
+                            status_code=503,
+                            detail=f"Ошибка при обращении к внешнему сервису: {exc}"
+                        )
+                    else:
+                        outcome["value"] = str(response.status_code)
+            except BaseException:
+                breaker.release()
+                raise
+
+            if response is not None:
+                if response.status_code < 500:
+                    breaker.record_success()
+                    if response.is_error:
+                        raise HTTPException(
+                            status_code=response.status_code,
+                            detail=f"Внешний сервис вернул ошибку: {response.text}"
+                        )
+                    return response
+                error = HTTPException(
+                    status_code=response.status_code,
+                    detail=f"Внешний сервис вернул ошибку: {response.text}"
+                )
+
+            breaker.record_failure()
+            attempt += 1
+            if attempt >= attempts or not self.retry_budget.withdraw():
+                raise error
+            await asyncio.sleep(jittered_backoff(attempt, GNS_RETRY_BACKOFF_BASE, GNS_RETRY_BACKOFF_MAX))
+            if not breaker.allow():
+                raise error
+
+    def stats(self) -> dict:
+        return {
+            "breakers": {name: breaker.snapshot() for name, breaker in self.breakers.items()},
+            "retryBudget": self.retry_budget.snapshot(),
+            "hedging": dict(self.hedging),
+        }
+
+    async def get_invoices(
+        self,
+        documentUuid: Optional[str] = None,
+        page: Optional[int] = None,
+        size: Optional[int] = None,
+        since: Optional[date] = None,
+    ) -> httpx.Response:
+        params = {"exchangeCode": documentUuid}
+        if page is not None:
+            params[GNS_PAGE_PARAM] = page
+        if size is not None:
+            params[GNS_SIZE_PARAM] = size
+        if since is not None:
+            params[GNS_SINCE_PARAM] = since.isoformat()
+        return await self.request("get", "GET", get_url, params=params)
+
+    async def create_invoice(self, payload: Union[dict, bytes]) -> httpx.Response:
+        # Уже сериализованное тело (model_dump_json) отправляем как есть
+        if isinstance(payload, bytes):
+            return await self.request("create", "POST", create_url, content=payload)
+        return await self.request("create", "POST", create_url, json=payload)
+
+    async def update_invoice(self, id: str, payload: Union[dict, bytes]) -> httpx.Response:
+        if isinstance(payload, bytes):
+            return await self.request("update", "PUT", f"{update_url}/{id}", content=payload)
+        return await self.request("update", "PUT", f"{update_url}/{id}", json=payload)
+
+    async def delete_invoice(self, invoice_id: str) -> httpx.Response:
+        return await self.request("delete", "DELETE", f"{delete_url}/{invoice_id}")
+
+
+gns_client = GNSClient()
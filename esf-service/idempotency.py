@@ -0,0 +1,283 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from tortoise import Tortoise
+
+from models import IdempotencyRecord
+
+
+# memory — только в пределах воркера, postgres — общий для всех воркеров
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory")
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 60 * 60)))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+# Сколько ждать запрос с тем же ключом, выполняющийся в другом воркере
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "30"))
+IDEMPOTENCY_POLL_INTERVAL = 0.2
+# Как часто удалять истёкшие ключи и сколько строк удалять за один запрос
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "600"))
+IDEMPOTENCY_PURGE_BATCH = 10000
+
+CANCELLED_DETAIL = "Запрос с этим Idempotency-Key был прерван, результат в ГНС неизвестен"
+
+
+def fingerprint(method: str, path: str, body: bytes = b"") -> str:
+    return hashlib.sha256(method.encode() + b" " + path.encode() + b"\n" + body).hexdigest()
+
+
+class MemoryStore:
+    """Завершённые ответы в памяти воркера с TTL."""
+
+    def __init__(self):
+        self._records: dict = {}
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[dict]:
+        record = self._records.get(key)
+        if record is None:
+            return None
+        if record["expires"] < time.monotonic():
+            del self._records[key]
+            return None
+        return record
+
+    async def complete(self, key: str, fingerprint: str, status_code: int, body: Any):
+        if len(self._records) >= IDEMPOTENCY_MAX_KEYS:
+            now = time.monotonic()
+            for stale in [k for k, r in self._records.items() if r["expires"] < now]:
+                del self._records[stale]
+            while len(self._records) >= IDEMPOTENCY_MAX_KEYS:
+                self._records.pop(next(iter(self._records)))
+        self._records[key] = {
+            "fingerprint": fingerprint,
+            "status": "done",
+            "statusCode": status_code,
+            "body": body,
+            "expires": time.monotonic() + IDEMPOTENCY_TTL,
+        }
+
+    async def release(self, key: str):
+        self._records.pop(key, None)
+
+    async def extend(self, key: str):
+        # Выполняющийся запрос в памяти не хранится, продлевать нечего
+        pass
+
+    async def purge(self) -> int:
+        now = time.monotonic()
+        expired = [key for key, record in self._records.items() if record["expires"] < now]
+        for key in expired:
+            del self._records[key]
+        return len(expired)
+
+
+class PostgresStore:
+    """
+    Ключи в таблице idempotency_keys. Первый воркер вставляет запись
+    в статусе pending, остальные видят её и ждут результата.
+    """
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[dict]:
+        table = IdempotencyRecord._meta.db_table
+        connection = Tortoise.get_connection("default")
+        # Пока запрос выполняется, запись живёт IDEMPOTENCY_WAIT секунд и продлевается
+        # выполняющим его воркером (`extend`): если воркер упал, ключ освободится сам
+        claimed = await connection.execute_query_dict(
+            f"""
+            INSERT INTO "{table}" ("key", "fingerprint", "status", "expiresAt")
+            VALUES ($1, $2, 'pending', now() + make_interval(secs => $3))
+            ON CONFLICT ("key") DO UPDATE
+            SET "fingerprint" = EXCLUDED."fingerprint", "status" = 'pending',
+                "statusCode" = NULL, "body" = NULL, "expiresAt" = EXCLUDED."expiresAt"
+            WHERE "{table}"."expiresAt" < now()
+            RETURNING "key"
+            """,
+            [key, fingerprint, IDEMPOTENCY_WAIT],
+        )
+        if claimed:
+            return None
+        rows = await connection.execute_query_dict(
+            f'SELECT "fingerprint", "status", "statusCode", "body"::text AS "body" FROM "{table}" WHERE "key" = $1',
+            [key],
+        )
+        if not rows:
+            return await self.claim(key, fingerprint)
+        record = rows[0]
+        record["body"] = json.loads(record["body"]) if record["body"] is not None else None
+        return record
+
+    async def complete(self, key: str, fingerprint: str, status_code: int, body: Any):
+        await Tortoise.get_connection("default").execute_query(
+            f"""
+            UPDATE "{IdempotencyRecord._meta.db_table}"
+            SET "status" = 'done', "statusCode" = $2, "body" = $3::jsonb,
+                "expiresAt" = now() + make_interval(secs => $4)
+            WHERE "key" = $1
+            """,
+            [key, status_code, json.dumps(body), IDEMPOTENCY_TTL],
+        )
+
+    async def release(self, key: str):
+        await IdempotencyRecord.filter(key=key, status="pending").delete()
+
+    async def extend(self, key: str):
+        await Tortoise.get_connection("default").execute_query(
+            f"""
+            UPDATE "{IdempotencyRecord._meta.db_table}"
+            SET "expiresAt" = now() + make_interval(secs => $2)
+            WHERE "key" = $1 AND "status" = 'pending'
+            """,
+            [key, IDEMPOTENCY_WAIT],
+        )
+
+    async def purge(self) -> int:
+        """Удаляет истёкшие ключи порциями, чтобы не держать долгую блокировку."""
+        table = IdempotencyRecord._meta.db_table
+        connection = Tortoise.get_connection("default")
+        total = 0
+        while True:
+            # Запрос начинается с DELETE: иначе Tortoise не вернёт число удалённых строк
+            deleted, _ = await connection.execute_query(
+                f"""DELETE FROM "{table}" WHERE "key" IN (
+                    SELECT "key" FROM "{table}" WHERE "expiresAt" < now() LIMIT $1
+                )""",
+                [IDEMPOTENCY_PURGE_BATCH],
+            )
+            total += deleted
+            if deleted < IDEMPOTENCY_PURGE_BATCH:
+                return total
+
+
+store = PostgresStore() if IDEMPOTENCY_BACKEND == "postgres" else MemoryStore()
+# Запросы, выполняющиеся в этом воркере: ключ -> (отпечаток, future)
+_inflight: dict = {}
+_purger: Optional[asyncio.Task] = None
+
+
+def _check(record_fingerprint: str, request_fingerprint: str):
+    if record_fingerprint != request_fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key уже использован для другого запроса"
+        )
+
+
+def _replay(record: dict):
+    if record["statusCode"] >= 400:
+        raise HTTPException(status_code=record["statusCode"], detail=record["body"]["detail"])
+    return record["body"]
+
+
+async def _keep_claim(key: str):
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_WAIT / 3)
+        try:
+            await store.extend(key)
+        except Exception as exc:
+            print(f"Ошибка продления Idempotency-Key: {exc}")
+
+
+async def _call_claimed(key: str, call: Callable[[], Awaitable[Any]]):
+    """
+    Выполняет `call`, продлевая запись pending: запрос в ГНС с повторами
+    (или пакет) может идти дольше IDEMPOTENCY_WAIT, и ключ не должен
+    истечь и достаться повтору из другого воркера.
+    """
+    heartbeat = asyncio.create_task(_keep_claim(key))
+    try:
+        return await call()
+    finally:
+        heartbeat.cancel()
+
+
+async def _execute(key: str, request_fingerprint: str, call: Callable[[], Awaitable[Any]]):
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT
+    record = await store.claim(key, request_fingerprint)
+    while record is not None and record["status"] == "pending":
+        _check(record["fingerprint"], request_fingerprint)
+        if time.monotonic() > deadline:
+            raise HTTPException(status_code=409, detail="Запрос с этим Idempotency-Key ещё выполняется")
+        await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+        record = await store.claim(key, request_fingerprint)
+    if record is not None:
+        _check(record["fingerprint"], request_fingerprint)
+        return _replay(record)
+
+    try:
+        body = await _call_claimed(key, call)
+    except HTTPException as exc:
+        # Ответ 4xx повторится при повторе, его запоминаем; 5xx можно повторить
+        if exc.status_code < 500:
+            await store.complete(key, request_fingerprint, exc.status_code, {"detail": exc.detail})
+        else:
+            await store.release(key)
+        raise
+    except asyncio.CancelledError:
+        # Запрос в ГНС мог уже уйти: ключ не освобождаем, до конца TTL повтор получит 409
+        await store.complete(key, request_fingerprint, 409, {"detail": CANCELLED_DETAIL})
+        raise
+    except BaseException:
+        await store.release(key)
+        raise
+    await store.complete(key, request_fingerprint, 200, body)
+    return body
+
+
+async def run_idempotent(key: Optional[str], request_fingerprint: str, call: Callable[[], Awaitable[Any]]):
+    """
+    Выполняет `call` не больше одного раза на Idempotency-Key.
+
+    Одновременные запросы с тем же ключом ждут первого и получают его
+    результат, завершённые ответы повторяются из хранилища до истечения TTL.
+    """
+    if not key:
+        return await call()
+
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        _check(inflight[0], request_fingerprint)
+        return await asyncio.shield(inflight[1])
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = (request_fingerprint, future)
+    try:
+        result = await _execute(key, request_fingerprint, call)
+    except BaseException as exc:
+        if isinstance(exc, asyncio.CancelledError):
+            # Первый запрос прервали; ожидающим отвечаем так, чтобы они повторили
+            exc = HTTPException(status_code=409, detail=CANCELLED_DETAIL)
+        future.set_exception(exc)
+        # Ожидающих может не быть: помечаем исключение как полученное
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(key, None)
+
+
+async def _purge_loop():
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_PURGE_INTERVAL)
+        try:
+            await store.purge()
+        except Exception as exc:
+            print(f"Ошибка очистки Idempotency-Key: {exc}")
+
+
+def start_purger():
+    global _purger
+    if _purger is None:
+        _purger = asyncio.create_task(_purge_loop())
+
+
+async def stop_purger():
+    global _purger
+    if _purger is not None:
+        _purger.cancel()
+        await asyncio.gather(_purger, return_exceptions=True)
+        _purger = None
@@ -0,0 +1,226 @@
+import hashlib
+from decimal import Decimal
+from typing import Dict, List
+
+from aggregates import SOURCE_COLUMNS, delta_ctes
+from metrics import stage
+from models import Contractor, Invoice, PaymentType, Currency, Status, ReceiptType, DeliveryType, LegalPerson, VatTaxType
+from refcache import ref_cache
+from schemas import InvoiceSchema
+
+
+# Справочники: поле документа -> (модель, ключ, колонки с типами Postgres)
+LOOKUPS = {
+    "paymentType": (PaymentType, "code", {"code": "varchar", "name": "varchar"}),
+    "currency": (Currency, "code", {"code": "varchar", "name": "varchar"}),
+    "status": (Status, "code", {"code": "varchar", "name": "varchar"}),
+    "receiptType": (ReceiptType, "code", {"code": "varchar", "name": "varchar"}),
+    "deliveryType": (DeliveryType, "code", {"code": "varchar", "name": "varchar"}),
+    "legalPerson": (LegalPerson, "pin", {
+        "pin": "varchar", "fullName": "varchar", "mainFullName": "varchar", "mainPin": "varchar"
+    }),
+    "contractor": (Contractor, "pin", {
+        "pin": "varchar", "fullName": "varchar", "mainFullName": "varchar", "mainPin": "varchar"
+    }),
+    "vatTaxType": (VatTaxType, "code", {"code": "varchar", "rate": "numeric", "name": "varchar"}),
+}
+
+INVOICE_COLUMNS = {
+    "documentUuid": "uuid",
+    "totalAmount": "numeric",
+    "createdDate": "date",
+    "deliveryDate": "date",
+    "invoiceDate": "date",
+    "ownedCrmReceiptCode": "varchar",
+    "invoiceNumber": "varchar",
+    "number": "varchar",
+    "note": "text",
+    "correctedReceiptUuid": "varchar",
+    "isResident": "boolean",
+    "contentHash": "varchar",
+    **{f"{name}_id": "int" for name in LOOKUPS},
+}
+
+
+def _unnest(columns: Dict[str, str]) -> str:
+    return ", ".join(f"${i}::{sql_type}[]" for i, sql_type in enumerate(columns.values(), 1))
+
+
+def _quoted(columns) -> str:
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+def collect_refs(invoices: List[InvoiceSchema], attr: str, key: str) -> dict:
+    """Уникальные значения справочника на странице, первое вхождение побеждает."""
+    refs = {}
+    for inv in invoices:
+        ref = getattr(inv, attr)
+        if ref is None or getattr(ref, key) is None:
+            continue
+        refs.setdefault(getattr(ref, key), ref)
+    return refs
+
+
+async def upsert_lookup(connection, model, key: str, columns: Dict[str, str], refs: dict) -> Dict[str, int]:
+    """
+    Добавляет недостающие записи справочника одним запросом
+    и возвращает отображение ключ -> id для всех `refs`.
+
+    Ключи, уже лежащие в `ref_cache`, в БД не запрашиваются.
+    """
+    table = ref_cache.table(model, key)
+    ids = {}
+    pending = {}
+    for value, ref in refs.items():
+        row = table.get(value)
+        if row is not None:
+            ids[value] = row["id"]
+        else:
+            pending[value] = ref
+    if not pending:
+        return ids
+
+    db_table = model._meta.db_table
+    cols = _quoted(columns)
+    query = f"""
+        WITH input ({cols}) AS (SELECT * FROM unnest({_unnest(columns)})),
+        inserted AS (
+            -- Один порядок вставки ключей у всех писателей: иначе две синхронизации
+            -- с пересекающимися новыми кодами ждут друг друга на уникальном индексе (40P01)
+            INSERT INTO "{db_table}" ({cols}) SELECT {cols} FROM input ORDER BY "{key}"
+            ON CONFLICT ("{key}") DO NOTHING
+            RETURNING id, {cols}
+        )
+        SELECT true AS inserted, id, {cols} FROM inserted
+        UNION ALL
+        SELECT false, t.id, {", ".join(f't."{column}"' for column in columns)}
+        FROM "{db_table}" t JOIN input USING ("{key}")
+    """
+    values = [[getattr(ref, column) for ref in pending.values()] for column in columns]
+    rows = await connection.execute_query_dict(query, values)
+
+    # Запись могла появиться в параллельной транзакции после нашего снимка
+    found = {row[key] for row in rows}
+    missing = [value for value in pending if value not in found]
+    if missing:
+        rows += await connection.execute_query_dict(
+            f'SELECT false AS inserted, id, {cols} FROM "{db_table}" WHERE "{key}" = ANY($1::{columns[key]}[])',
+            [missing],
+        )
+
+    for row in rows:
+        ids[row[key]] = row["id"]
+        # Новую запись кэшируем только после того, как увидим её закоммиченной:
+        # транзакция синхронизации ещё может откатиться
+        if row.pop("inserted"):
+            table.invalidate(row[key])
+        else:
+            table.put(row)
+    return ids
+
+
+def content_hash(inv: InvoiceSchema) -> str:
+    return hashlib.blake2b(inv.model_dump_json().encode(), digest_size=16).hexdigest()
+
+
+def invoice_row(inv: InvoiceSchema, lookup_ids: Dict[str, Dict[str, int]]) -> dict:
+    row = {
+        "documentUuid": inv.documentUuid,
+        "totalAmount": Decimal(str(inv.totalAmount)),
+        "createdDate": inv.createdDate,
+        "deliveryDate": inv.deliveryDate,
+        "invoiceDate": inv.invoiceDate,
+        "ownedCrmReceiptCode": inv.ownedCrmReceiptCode,
+        "invoiceNumber": inv.invoiceNumber,
+        "number": inv.number,
+        "note": inv.note,
+        "correctedReceiptUuid": inv.correctedReceiptUuid,
+        "isResident": inv.isResident.lower() == "true" if inv.isResident else None,
+        "contentHash": content_hash(inv),
+    }
+    for attr, (_, key, _) in LOOKUPS.items():
+        ref = getattr(inv, attr)
+        row[f"{attr}_id"] = lookup_ids[attr].get(getattr(ref, key)) if ref is not None else None
+    return row
+
+
+async def upsert_invoices(connection, rows: List[dict]) -> dict:
+    """
+    Вставляет или обновляет все документы страницы одним
+    `INSERT ... ON CONFLICT ("documentUuid")`. Строки с тем же
+    `contentHash` не перезаписываются и не возвращаются.
+
+    В том же запросе сводка invoice_totals получает разницу между
+    прежними и новыми версиями записанных документов.
+    """
+    if not rows:
+        return {"inserted": 0, "updated": 0, "unchanged": 0, "ids": []}
+    table = Invoice._meta.db_table
+    cols = _quoted(INVOICE_COLUMNS)
+    source = _quoted(SOURCE_COLUMNS)
+    updates = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in INVOICE_COLUMNS if column != "documentUuid")
+    uuids = [row["documentUuid"] for row in rows]
+
+    # Блокировка на каждый documentUuid страницы, включая ещё не существующие:
+    # FOR UPDATE не видит документ, который параллельно вставляет другой писатель,
+    # и тогда оба записали бы в сводку +1. Блокировки держатся до коммита, а основной
+    # запрос (READ COMMITTED) берёт снимок уже после них и видит чужую вставку.
+    # Порядок ключей один у всех писателей — без взаимных блокировок
+    await connection.execute_query(
+        """
+        SELECT pg_advisory_xact_lock(k) FROM (
+            SELECT DISTINCT hashtextextended(u::text, 0) AS k FROM unnest($1::uuid[]) AS u ORDER BY k
+        ) AS keys
+        """,
+        [uuids],
+    )
+    query = f"""
+        WITH incoming AS (
+            SELECT * FROM unnest({_unnest(INVOICE_COLUMNS)}) AS t ({cols})
+        ),
+        previous AS (
+            SELECT "id", {source} FROM "{table}" WHERE "documentUuid" = ANY(${len(INVOICE_COLUMNS) + 1}::uuid[])
+        ),
+        upserted AS (
+            INSERT INTO "{table}" ({cols})
+            SELECT * FROM incoming
+            ON CONFLICT ("documentUuid") DO UPDATE SET {updates}
+            WHERE "{table}"."contentHash" IS DISTINCT FROM EXCLUDED."contentHash"
+            RETURNING "id", (xmax = 0) AS inserted, {source}
+        ),
+        replaced AS (
+            SELECT previous.* FROM previous JOIN upserted USING ("id")
+        ),
+        {delta_ctes("upserted", "replaced")}
+        SELECT "id", "inserted" FROM upserted
+    """
+    values = [[row[column] for row in rows] for column in INVOICE_COLUMNS]
+    result = await connection.execute_query_dict(query, [*values, uuids])
+    inserted = sum(1 for row in result if row["inserted"])
+    return {
+        "inserted": inserted,
+        "updated": len(result) - inserted,
+        "unchanged": len(rows) - len(result),
+        "ids": [row["id"] for row in result],
+    }
+
+
+async def ingest_page(connection, invoices: List[InvoiceSchema]) -> dict:
+    """
+    Сохраняет страницу документов ГНС: по запросу на каждый справочник
+    и один запрос на все документы. В `ids` — id затронутых документов.
+    """
+    lookup_ids = {}
+    with stage("sync", "lookups"):
+        for attr, (model, key, columns) in LOOKUPS.items():
+            refs = collect_refs(invoices, attr, key)
+            lookup_ids[attr] = await upsert_lookup(connection, model, key, columns, refs)
+
+    # ON CONFLICT не может изменить одну строку дважды за запрос
+    rows = {}
+    for inv in invoices:
+        rows[inv.documentUuid] = invoice_row(inv, lookup_ids)
+
+    with stage("sync", "upsert"):
+        counts = await upsert_invoices(connection, list(rows.values()))
+    return {"saved": len(rows), **counts}
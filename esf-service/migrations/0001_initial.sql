@@ -0,0 +1,68 @@
+-- Схема на момент перехода на миграции (раньше создавалась generate_schemas)
+CREATE TABLE IF NOT EXISTS "contractor" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "pin" VARCHAR(20),
+    "fullName" VARCHAR(255),
+    "mainFullName" VARCHAR(255),
+    "mainPin" VARCHAR(20)
+);
+CREATE TABLE IF NOT EXISTS "currency" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "code" VARCHAR(10),
+    "name" VARCHAR(50)
+);
+CREATE TABLE IF NOT EXISTS "deliverytype" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "code" VARCHAR(20),
+    "name" VARCHAR(255)
+);
+CREATE TABLE IF NOT EXISTS "legalperson" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "pin" VARCHAR(20),
+    "fullName" VARCHAR(255),
+    "mainFullName" VARCHAR(255),
+    "mainPin" VARCHAR(20)
+);
+CREATE TABLE IF NOT EXISTS "paymenttype" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "code" VARCHAR(20),
+    "name" VARCHAR(255)
+);
+CREATE TABLE IF NOT EXISTS "receipttype" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "code" VARCHAR(20),
+    "name" VARCHAR(255)
+);
+CREATE TABLE IF NOT EXISTS "status" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "code" VARCHAR(20),
+    "name" VARCHAR(100)
+);
+CREATE TABLE IF NOT EXISTS "vattaxtype" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "rate" DECIMAL(5,2),
+    "name" VARCHAR(255),
+    "code" VARCHAR(20)
+);
+CREATE TABLE IF NOT EXISTS "invoices" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "documentUuid" UUID NOT NULL,
+    "totalAmount" DECIMAL(15,2) NOT NULL,
+    "createdDate" DATE,
+    "deliveryDate" DATE,
+    "invoiceDate" DATE,
+    "ownedCrmReceiptCode" VARCHAR(255),
+    "invoiceNumber" VARCHAR(100),
+    "number" VARCHAR(100),
+    "note" TEXT,
+    "correctedReceiptUuid" VARCHAR(255),
+    "isResident" BOOL,
+    "contractor_id" INT REFERENCES "contractor" ("id") ON DELETE CASCADE,
+    "currency_id" INT REFERENCES "currency" ("id") ON DELETE CASCADE,
+    "deliveryType_id" INT REFERENCES "deliverytype" ("id") ON DELETE CASCADE,
+    "legalPerson_id" INT REFERENCES "legalperson" ("id") ON DELETE CASCADE,
+    "paymentType_id" INT REFERENCES "paymenttype" ("id") ON DELETE CASCADE,
+    "receiptType_id" INT REFERENCES "receipttype" ("id") ON DELETE CASCADE,
+    "status_id" INT REFERENCES "status" ("id") ON DELETE CASCADE,
+    "vatTaxType_id" INT REFERENCES "vattaxtype" ("id") ON DELETE CASCADE
+);
@@ -0,0 +1,113 @@
+-- Уникальные ключи справочников и документов (нужны для ON CONFLICT при синхронизации),
+-- индексы курсорной выдачи, outbox, Idempotency-Key, состояние синхронизации и contentHash.
+
+-- Дубли справочников, накопившиеся до уникальных ключей: документы переводим
+-- на строку с наименьшим id и только потом удаляем лишние (FK с ON DELETE CASCADE)
+UPDATE "invoices" AS i SET "paymentType_id" = d."keep"
+FROM (
+    SELECT "id", min("id") OVER (PARTITION BY "code") AS "keep" FROM "paymenttype" WHERE "code" IS NOT NULL
+) AS d
+WHERE i."paymentType_id" = d."id" AND d."id" <> d."keep";
+DELETE FROM "paymenttype" AS a USING "paymenttype" AS b WHERE a."code" = b."code" AND a."id" > b."id";
+CREATE UNIQUE INDEX IF NOT EXISTS "paymenttype_code_key" ON "paymenttype" ("code");
+
+UPDATE "invoices" AS i SET "currency_id" = d."keep"
+FROM (
+    SELECT "id", min("id") OVER (PARTITION BY "code") AS "keep" FROM "currency" WHERE "code" IS NOT NULL
+) AS d
+WHERE i."currency_id" = d."id" AND d."id" <> d."keep";
+DELETE FROM "currency" AS a USING "currency" AS b WHERE a."code" = b."code" AND a."id" > b."id";
+CREATE UNIQUE INDEX IF NOT EXISTS "currency_code_key" ON "currency" ("code");
+
+UPDATE "invoices" AS i SET "status_id" = d."keep"
+FROM (
+    SELECT "id", min("id") OVER (PARTITION BY "code") AS "keep" FROM "status" WHERE "code" IS NOT NULL
+) AS d
+WHERE i."status_id" = d."id" AND d."id" <> d."keep";
+DELETE FROM "status" AS a USING "status" AS b WHERE a."code" = b."code" AND a."id" > b."id";
+CREATE UNIQUE INDEX IF NOT EXISTS "status_code_key" ON "status" ("code");
+
+UPDATE "invoices" AS i SET "receiptType_id" = d."keep"
+FROM (
+    SELECT "id", min("id") OVER (PARTITION BY "code") AS "keep" FROM "receipttype" WHERE "code" IS NOT NULL
+) AS d
+WHERE i."receiptType_id" = d."id" AND d."id" <> d."keep";
+DELETE FROM "receipttype" AS a USING "receipttype" AS b WHERE a."code" = b."code" AND a."id" > b."id";
+CREATE UNIQUE INDEX IF NOT EXISTS "receipttype_code_key" ON "receipttype" ("code");
+
+UPDATE "invoices" AS i SET "deliveryType_id" = d."keep"
+FROM (
+    SELECT "id", min("id") OVER (PARTITION BY "code") AS "keep" FROM "deliverytype" WHERE "code" IS NOT NULL
+) AS d
+WHERE i."deliveryType_id" = d."id" AND d."id" <> d."keep";
+DELETE FROM "deliverytype" AS a USING "deliverytype" AS b WHERE a."code" = b."code" AND a."id" > b."id";
+CREATE UNIQUE INDEX IF NOT EXISTS "deliverytype_code_key" ON "deliverytype" ("code");
+
+UPDATE "invoices" AS i SET "legalPerson_id" = d."keep"
+FROM (
+    SELECT "id", min("id") OVER (PARTITION BY "pin") AS "keep" FROM "legalperson" WHERE "pin" IS NOT NULL
+) AS d
+WHERE i."legalPerson_id" = d."id" AND d."id" <> d."keep";
+DELETE FROM "legalperson" AS a USING "legalperson" AS b WHERE a."pin" = b."pin" AND a."id" > b."id";
+CREATE UNIQUE INDEX IF NOT EXISTS "legalperson_pin_key" ON "legalperson" ("pin");
+
+UPDATE "invoices" AS i SET "contractor_id" = d."keep"
+FROM (
+    SELECT "id", min("id") OVER (PARTITION BY "pin") AS "keep" FROM "contractor" WHERE "pin" IS NOT NULL
+) AS d
+WHERE i."contractor_id" = d."id" AND d."id" <> d."keep";
+DELETE FROM "contractor" AS a USING "contractor" AS b WHERE a."pin" = b."pin" AND a."id" > b."id";
+CREATE UNIQUE INDEX IF NOT EXISTS "contractor_pin_key" ON "contractor" ("pin");
+
+UPDATE "invoices" AS i SET "vatTaxType_id" = d."keep"
+FROM (
+    SELECT "id", min("id") OVER (PARTITION BY "code") AS "keep" FROM "vattaxtype" WHERE "code" IS NOT NULL
+) AS d
+WHERE i."vatTaxType_id" = d."id" AND d."id" <> d."keep";
+DELETE FROM "vattaxtype" AS a USING "vattaxtype" AS b WHERE a."code" = b."code" AND a."id" > b."id";
+CREATE UNIQUE INDEX IF NOT EXISTS "vattaxtype_code_key" ON "vattaxtype" ("code");
+
+-- Дубли документов: оставляем последнюю загруженную версию
+DELETE FROM "invoices" AS a USING "invoices" AS b WHERE a."documentUuid" = b."documentUuid" AND a."id" < b."id";
+CREATE UNIQUE INDEX IF NOT EXISTS "invoices_documentUuid_key" ON "invoices" ("documentUuid");
+
+ALTER TABLE "invoices" ADD COLUMN IF NOT EXISTS "contentHash" VARCHAR(32);
+
+CREATE INDEX IF NOT EXISTS "idx_invoices_invoice_9ef4dc" ON "invoices" ("invoiceDate", "id");
+CREATE INDEX IF NOT EXISTS "idx_invoices_status__a3a6ad" ON "invoices" ("status_id", "invoiceDate", "id");
+CREATE INDEX IF NOT EXISTS "idx_invoices_contrac_799a86" ON "invoices" ("contractor_id", "invoiceDate", "id");
+CREATE INDEX IF NOT EXISTS "idx_invoices_currenc_f924b5" ON "invoices" ("currency_id", "invoiceDate", "id");
+
+CREATE TABLE IF NOT EXISTS "submission_outbox" (
+    "id" UUID NOT NULL  PRIMARY KEY,
+    "operation" VARCHAR(20) NOT NULL,
+    "targetId" VARCHAR(255),
+    "payload" JSONB NOT NULL,
+    "status" VARCHAR(20) NOT NULL  DEFAULT 'pending',
+    "attempts" INT NOT NULL  DEFAULT 0,
+    "nextAttemptAt" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "lastError" TEXT,
+    "response" JSONB,
+    "createdAt" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "updatedAt" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS "idx_submission__status_4d7abd" ON "submission_outbox" ("status", "nextAttemptAt");
+
+CREATE TABLE IF NOT EXISTS "idempotency_keys" (
+    "key" VARCHAR(255) NOT NULL  PRIMARY KEY,
+    "fingerprint" VARCHAR(64) NOT NULL,
+    "status" VARCHAR(20) NOT NULL  DEFAULT 'pending',
+    "statusCode" INT,
+    "body" JSONB,
+    "expiresAt" TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "idx_idempotency_expires_c2778d" ON "idempotency_keys" ("expiresAt");
+
+CREATE TABLE IF NOT EXISTS "sync_state" (
+    "key" VARCHAR(64) NOT NULL  PRIMARY KEY,
+    "watermark" DATE,
+    "lastSyncAt" TIMESTAMPTZ,
+    "lastResult" JSONB,
+    "lockedBy" VARCHAR(255),
+    "lockedUntil" TIMESTAMPTZ
+);
@@ -0,0 +1,21 @@
+-- Сводка для отчётов; поддерживается синхронизацией (ingest.upsert_invoices)
+CREATE TABLE IF NOT EXISTS "invoice_totals" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "month" DATE,
+    "contractor_id" INT,
+    "status_id" INT,
+    "currency_id" INT,
+    "vatTaxType_id" INT,
+    "count" BIGINT NOT NULL  DEFAULT 0,
+    "totalAmount" DECIMAL(20,2) NOT NULL  DEFAULT 0,
+    -- NULL в измерении (нет даты, статуса и т. п.) — отдельная группа, а не новая строка на каждый документ
+    CONSTRAINT "uid_invoice_tot_month_1ca538" UNIQUE NULLS NOT DISTINCT ("month", "contractor_id", "status_id", "currency_id", "vatTaxType_id")
+);
+
+-- Начальное заполнение по уже загруженным документам
+INSERT INTO "invoice_totals" ("month", "contractor_id", "status_id", "currency_id", "vatTaxType_id", "count", "totalAmount")
+SELECT date_trunc('month', "invoiceDate")::date, "contractor_id", "status_id", "currency_id", "vatTaxType_id",
+       count(*), sum("totalAmount")
+FROM "invoices"
+GROUP BY 1, 2, 3, 4, 5
+ON CONFLICT DO NOTHING;
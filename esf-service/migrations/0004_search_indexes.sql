@@ -0,0 +1,12 @@
+-- Поиск документов (GET /invoices/search): триграммные индексы под ILIKE '%…%'
+-- и ранжирование по similarity()
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS "invoices_invoicenumber_trgm" ON "invoices" USING gin ("invoiceNumber" gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS "invoices_number_trgm" ON "invoices" USING gin ("number" gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS "invoices_ownedcrmreceiptcode_trgm" ON "invoices" USING gin ("ownedCrmReceiptCode" gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS "contractor_fullname_trgm" ON "contractor" USING gin ("fullName" gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS "legalperson_fullname_trgm" ON "legalperson" USING gin ("fullName" gin_trgm_ops);
+
+-- Последние документы найденного юрлица (для контрагента индекс уже есть)
+CREATE INDEX IF NOT EXISTS "idx_invoices_legalPe_c5d3c2" ON "invoices" ("legalPerson_id", "invoiceDate", "id");
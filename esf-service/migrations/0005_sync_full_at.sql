@@ -0,0 +1,3 @@
+-- Время последней полной синхронизации: планировщик периодически запускает полную,
+-- потому что инкрементальная не видит изменений старых документов
+ALTER TABLE "sync_state" ADD COLUMN IF NOT EXISTS "lastFullSyncAt" TIMESTAMPTZ;
@@ -0,0 +1,11 @@
+-- Аренда и результат загрузки страницы для /get_invoices/: раньше жили в sync_state
+-- под ключами page:* и удалялись только при записи другой страницы
+CREATE TABLE IF NOT EXISTS "page_sync" (
+    "key" VARCHAR(64) NOT NULL PRIMARY KEY,
+    "lockedBy" VARCHAR(255),
+    "lockedUntil" TIMESTAMPTZ,
+    "finishedAt" TIMESTAMPTZ,
+    "result" JSONB
+);
+CREATE INDEX IF NOT EXISTS "idx_page_sync_finishe_aa80bd" ON "page_sync" ("finishedAt");
+DELETE FROM "sync_state" WHERE "key" LIKE 'page:%';
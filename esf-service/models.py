@@ -5,37 +5,37 @@ from uuid import UUID
 
 class PaymentType(Model):
     id = fields.IntField(pk=True)
-    code = fields.CharField(max_length=20, null=True)
+    code = fields.CharField(max_length=20, null=True, unique=True)
     name = fields.CharField(max_length=255, null=True)
 
 
 class Currency(Model):
     id = fields.IntField(pk=True)
-    code = fields.CharField(max_length=10, null=True)
+    code = fields.CharField(max_length=10, null=True, unique=True)
     name = fields.CharField(max_length=50, null=True)
 
 
 class Status(Model):
     id = fields.IntField(pk=True)
-    code = fields.CharField(max_length=20, null=True)
+    code = fields.CharField(max_length=20, null=True, unique=True)
     name = fields.CharField(max_length=100, null=True)
 
 
 class ReceiptType(Model):
     id = fields.IntField(pk=True)
-    code = fields.CharField(max_length=20, null=True)
+    code = fields.CharField(max_length=20, null=True, unique=True)
     name = fields.CharField(max_length=255, null=True)
 
 
 class DeliveryType(Model):
     id = fields.IntField(pk=True)
-    code = fields.CharField(max_length=20, null=True)
+    code = fields.CharField(max_length=20, null=True, unique=True)
     name = fields.CharField(max_length=255, null=True)
 
 
 class LegalPerson(Model):
     id = fields.IntField(pk=True)
-    pin = fields.CharField(max_length=20, null=True)
+    pin = fields.CharField(max_length=20, null=True, unique=True)
     fullName = fields.CharField(max_length=255, null=True)
     mainFullName = fields.CharField(max_length=255, null=True)
     mainPin = fields.CharField(max_length=20, null=True)
@@ -43,7 +43,7 @@ class LegalPerson(Model):
 
 class Contractor(Model):
     id = fields.IntField(pk=True)
-    pin = fields.CharField(max_length=20, null=True)
+    pin = fields.CharField(max_length=20, null=True, unique=True)
     fullName = fields.CharField(max_length=255, null=True)
     mainFullName = fields.CharField(max_length=255, null=True)
     mainPin = fields.CharField(max_length=20, null=True)
@@ -53,12 +53,12 @@ class VatTaxType(Model):
     id = fields.IntField(pk=True)
     rate = fields.DecimalField(max_digits=5, decimal_places=2, null=True)
     name = fields.CharField(max_length=255, null=True)
-    code = fields.CharField(max_length=20, null=True)
+    code = fields.CharField(max_length=20, null=True, unique=True)
 
 
 class Invoice(Model):
     id = fields.IntField(pk=True)
-    documentUuid = fields.UUIDField()
+    documentUuid = fields.UUIDField(unique=True)
     totalAmount = fields.DecimalField(max_digits=15, decimal_places=2)
     createdDate = fields.DateField(null=True)
     deliveryDate = fields.DateField(null=True)
@@ -69,6 +69,8 @@ class Invoice(Model):
     note = fields.TextField(null=True)
     correctedReceiptUuid = fields.CharField(max_length=255, null=True)
     isResident = fields.BooleanField(null=True)
+    # Хэш содержимого документа из ГНС: неизменённые строки синхронизация не перезаписывает
+    contentHash = fields.CharField(max_length=32, null=True)
 
     paymentType = fields.ForeignKeyField("models.PaymentType", related_name="invoices", null=True)
     currency = fields.ForeignKeyField("models.Currency", related_name="invoices", null=True)
@@ -80,4 +82,97 @@ class Invoice(Model):
     vatTaxType = fields.ForeignKeyField("models.VatTaxType", related_name="invoices", null=True)
 
     class Meta:
-        table = "invoices"
\ No newline at end of file
+        table = "invoices"
+        # Под курсорную выдачу /invoices/ и её фильтры
+        indexes = (
+            ("invoiceDate", "id"),
+            ("status", "invoiceDate", "id"),
+            ("contractor", "invoiceDate", "id"),
+            ("currency", "invoiceDate", "id"),
+            ("legalPerson", "invoiceDate", "id"),
+        )
+        # Триграммные индексы для поиска (GIN, gin_trgm_ops) объявлены только в миграции 0004
+
+class InvoiceTotal(Model):
+    """
+    Сводка по документам: месяц (по invoiceDate) x контрагент x статус x валюта x НДС.
+    Поддерживается синхронизацией, пересчитывается `python aggregates.py --rebuild`.
+    """
+    id = fields.IntField(pk=True)
+    month = fields.DateField(null=True)
+    contractor_id = fields.IntField(null=True)
+    status_id = fields.IntField(null=True)
+    currency_id = fields.IntField(null=True)
+    vatTaxType_id = fields.IntField(null=True)
+    count = fields.BigIntField(default=0)
+    totalAmount = fields.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        table = "invoice_totals"
+        # В миграции ключ объявлен NULLS NOT DISTINCT: NULL в измерении — тоже группа
+        unique_together = (("month", "contractor_id", "status_id", "currency_id", "vatTaxType_id"),)
+
+class SubmissionJob(Model):
+    """Отправка документа в ГНС, ожидающая фонового воркера (outbox)."""
+    id = fields.UUIDField(pk=True)
+    operation = fields.CharField(max_length=20)
+    targetId = fields.CharField(max_length=255, null=True)
+    payload = fields.JSONField()
+    status = fields.CharField(max_length=20, default="pending")
+    attempts = fields.IntField(default=0)
+    # Когда задачу можно взять: время следующей попытки или конец аренды воркером
+    nextAttemptAt = fields.DatetimeField(auto_now_add=True)
+    lastError = fields.TextField(null=True)
+    response = fields.JSONField(null=True)
+    createdAt = fields.DatetimeField(auto_now_add=True)
+    updatedAt = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "submission_outbox"
+        indexes = (("status", "nextAttemptAt"),)
+
+
+class IdempotencyRecord(Model):
+    """Результат запроса с заголовком Idempotency-Key, общий для всех воркеров."""
+    key = fields.CharField(max_length=255, pk=True)
+    fingerprint = fields.CharField(max_length=64)
+    status = fields.CharField(max_length=20, default="pending")
+    statusCode = fields.IntField(null=True)
+    body = fields.JSONField(null=True)
+    expiresAt = fields.DatetimeField(index=True)
+
+    class Meta:
+        table = "idempotency_keys"
+
+
+class SyncState(Model):
+    """
+    Водяной знак инкрементальной синхронизации по ИНН и аренда,
+    не дающая двум воркерам синхронизировать одновременно.
+    """
+    key = fields.CharField(max_length=64, pk=True)
+    watermark = fields.DateField(null=True)
+    lastSyncAt = fields.DatetimeField(null=True)
+    lastResult = fields.JSONField(null=True)
+    # Последняя полная синхронизация: по ней планировщик решает, когда нужна следующая
+    lastFullSyncAt = fields.DatetimeField(null=True)
+    lockedBy = fields.CharField(max_length=255, null=True)
+    lockedUntil = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "sync_state"
+
+
+class PageSync(Model):
+    """
+    Аренда загрузки страницы ГНС для /get_invoices/ и её результат:
+    одновременные запросы из других воркеров ждут его, а не идут в ГНС сами.
+    """
+    key = fields.CharField(max_length=64, pk=True)
+    lockedBy = fields.CharField(max_length=255, null=True)
+    lockedUntil = fields.DatetimeField(null=True)
+    finishedAt = fields.DatetimeField(null=True, index=True)
+    result = fields.JSONField(null=True)
+
+    class Meta:
+        table = "page_sync"
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import random
+from typing import List, Optional
+
+import orjson
+
+from tortoise import Tortoise
+
+from gns_client import gns_client
+from models import SubmissionJob
+
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "2"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+# Сколько задача считается занятой воркером; после этого её подберёт другой
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+
+
+OPERATIONS = {
+    "create": lambda job: gns_client.create_invoice(job["payload"]),
+    "update": lambda job: gns_client.update_invoice(job["targetId"], job["payload"]),
+}
+
+_workers: List[asyncio.Task] = []
+# Своё событие у каждого воркера: сбрасывает его только владелец,
+# поэтому пробуждение не теряется, пока воркер занят задачей
+_wakeups: List[asyncio.Event] = []
+
+
+def wake():
+    for event in _wakeups:
+        event.set()
+
+
+async def enqueue(operation: str, payload: dict, targetId: Optional[str] = None) -> SubmissionJob:
+    job = await SubmissionJob.create(operation=operation, targetId=targetId, payload=payload)
+    wake()
+    return job
+
+
+async def claim_job() -> Optional[dict]:
+    """
+    Берёт одну готовую задачу. `SKIP LOCKED` не даёт двум воркерам
+    (в том числе из разных процессов) взять одну и ту же задачу.
+    """
+    table = SubmissionJob._meta.db_table
+    rows = await Tortoise.get_connection("default").execute_query_dict(
+        f"""
+        WITH next AS (
+            SELECT "id" FROM "{table}"
+            WHERE "status" IN ('pending', 'processing') AND "nextAttemptAt" <= now()
+            ORDER BY "nextAttemptAt"
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE "{table}" AS job
+        SET "status" = 'processing',
+            "attempts" = job."attempts" + 1,
+            "nextAttemptAt" = now() + make_interval(secs => $1),
+            "updatedAt" = now()
+        FROM next WHERE job."id" = next."id"
+        RETURNING job."id", job."operation", job."targetId", job."payload"::text AS "payload", job."attempts"
+        """,
+        [OUTBOX_LEASE_SECONDS],
+    )
+    if not rows:
+        return None
+    job = rows[0]
+    job["payload"] = json.loads(job["payload"])
+    return job
+
+
+async def finish_job(job_id, status: str, error: Optional[str] = None, response=None, delay: float = 0):
+    table = SubmissionJob._meta.db_table
+    await Tortoise.get_connection("default").execute_query(
+        f"""
+        UPDATE "{table}"
+        SET "status" = $2, "lastError" = $3, "response" = $4::jsonb,
+            "nextAttemptAt" = now() + make_interval(secs => $5), "updatedAt" = now()
+        WHERE "id" = $1
+        """,
+        [job_id, status, error, json.dumps(response) if response is not None else None, delay],
+    )
+
+
+def backoff(attempts: int) -> float:
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def response_body(response):
+    """Тело ответа ГНС для записи; не-JSON сохраняется как текст."""
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return {"raw": response.text}
+
+
+async def process_job(job: dict):
+    try:
+        response = await OPERATIONS[job["operation"]](job)
+    except Exception as exc:
+        status_code = getattr(exc, "status_code", 500)
+        error = str(getattr(exc, "detail", exc))
+        # 4xx от ГНС повторять бессмысленно, кроме 408 и 429
+        retriable = status_code >= 500 or status_code in (408, 429)
+        if retriable and job["attempts"] < OUTBOX_MAX_ATTEMPTS:
+            delay = backoff(job["attempts"])
+            await finish_job(job["id"], "pending", error=error, delay=delay)
+            asyncio.get_running_loop().call_later(delay, wake)
+        else:
+            await finish_job(job["id"], "failed", error=error)
+        return
+    # Успешный ответ — документ в ГНС уже принят, даже если тело не разобрать:
+    # повтор создал бы его второй раз
+    await finish_job(job["id"], "done", response=response_body(response))
+
+
+async def _worker(wakeup: asyncio.Event):
+    while True:
+        wakeup.clear()
+        try:
+            job = await claim_job()
+        except Exception as exc:
+            print(f"Ошибка outbox: {exc}")
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(wakeup.wait(), OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        try:
+            await process_job(job)
+        except Exception as exc:
+            # Задачу подберём снова, когда истечёт аренда
+            print(f"Ошибка outbox: {exc}")
+
+
+def start_workers():
+    if not _workers:
+        _wakeups[:] = [asyncio.Event() for _ in range(OUTBOX_WORKERS)]
+        _workers.extend(asyncio.create_task(_worker(event)) for event in _wakeups)
+
+
+async def stop_workers():
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _wakeups.clear()
@@ -0,0 +1,52 @@
+import base64
+import json
+from datetime import date
+from typing import Optional
+
+from fastapi import HTTPException
+from tortoise.expressions import Q
+
+
+def encode_cursor(row: dict, order: str) -> str:
+    value = row[order]
+    if isinstance(value, date):
+        value = value.isoformat()
+    payload = json.dumps({"id": row["id"], order: value}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        result = {"id": int(data["id"])}
+        if order != "id":
+            value = data[order]
+            result[order] = date.fromisoformat(value) if value is not None else None
+        return result
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def keyset_filter(cursor: dict, order: str, descending: bool) -> Q:
+    """
+    Условие «строго после курсора» для сортировки по (`order`, id).
+
+    Postgres кладёт NULL в конец при ASC и в начало при DESC,
+    поэтому документы без даты обрабатываются отдельно.
+    """
+    after = "lt" if descending else "gt"
+    if order == "id":
+        return Q(**{f"id__{after}": cursor["id"]})
+
+    value: Optional[date] = cursor[order]
+    if value is None:
+        condition = Q(**{f"{order}__isnull": True, f"id__{after}": cursor["id"]})
+        if descending:
+            condition |= Q(**{f"{order}__not_isnull": True})
+        return condition
+
+    condition = Q(**{f"{order}__{after}": value}) | Q(**{order: value, f"id__{after}": cursor["id"]})
+    if not descending:
+        condition |= Q(**{f"{order}__isnull": True})
+    return condition
@@ -0,0 +1,124 @@
+import os
+from collections import OrderedDict
+from typing import Optional
+
+
+# Размер кэша на один справочник по коду и на справочники по ПИН
+REF_CACHE_SIZE = int(os.getenv("REF_CACHE_SIZE", "1000"))
+REF_CACHE_PIN_SIZE = int(os.getenv("REF_CACHE_PIN_SIZE", "10000"))
+
+
+class RefTable:
+    """
+    Кэш одного справочника: ключ (code/pin) -> строка.
+
+    При переполнении вытесняется давно не использованная запись.
+    Обратный индекс id -> ключ нужен для чтения документов.
+    """
+
+    def __init__(self, model, key: str, maxsize: int):
+        self.model = model
+        self.key = key
+        self.maxsize = maxsize
+        self._rows: OrderedDict = OrderedDict()
+        self._ids: dict = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, value) -> Optional[dict]:
+        row = self._rows.get(value)
+        if row is not None:
+            self._rows.move_to_end(value)
+        return row
+
+    def get_by_id(self, id: int) -> Optional[dict]:
+        value = self._ids.get(id)
+        return self.get(value) if value is not None else None
+
+    def put(self, row: dict):
+        value = row[self.key]
+        if value is None:
+            return
+        self.invalidate(value)
+        self._rows[value] = row
+        self._ids[row["id"]] = value
+        while len(self._rows) > self.maxsize:
+            _, evicted = self._rows.popitem(last=False)
+            self._ids.pop(evicted["id"], None)
+
+    def invalidate(self, value):
+        row = self._rows.pop(value, None)
+        if row is not None:
+            self._ids.pop(row["id"], None)
+
+    def clear(self):
+        self._rows.clear()
+        self._ids.clear()
+
+
+class RefCache:
+    """Кэш справочников в памяти воркера."""
+
+    def __init__(self):
+        self._tables = {}
+
+    def table(self, model, key: str) -> RefTable:
+        name = model._meta.db_table
+        if name not in self._tables:
+            maxsize = REF_CACHE_PIN_SIZE if key == "pin" else REF_CACHE_SIZE
+            self._tables[name] = RefTable(model, key, maxsize)
+        return self._tables[name]
+
+    async def warm(self, lookups):
+        """
+        Загружает справочники по коду целиком (в пределах размера кэша).
+        Справочники по ПИН наполняются по мере обращения.
+        """
+        for model, key in lookups:
+            if key == "pin":
+                continue
+            table = self.table(model, key)
+            table.clear()
+            for row in await model.all().order_by("id").limit(table.maxsize).values():
+                table.put(row)
+
+    async def get(self, model, key: str, value) -> Optional[dict]:
+        table = self.table(model, key)
+        row = table.get(value)
+        if row is None:
+            rows = await model.filter(**{key: value}).values()
+            if not rows:
+                return None
+            row = rows[0]
+            table.put(row)
+        return row
+
+    async def get_id(self, model, key: str, value) -> Optional[int]:
+        row = await self.get(model, key, value)
+        return row["id"] if row is not None else None
+
+    async def get_by_id(self, model, key: str, id: Optional[int]) -> Optional[dict]:
+        if id is None:
+            return None
+        table = self.table(model, key)
+        row = table.get_by_id(id)
+        if row is None:
+            rows = await model.filter(id=id).values()
+            if not rows:
+                return None
+            row = rows[0]
+            table.put(row)
+        return row
+
+    def invalidate(self, model=None):
+        tables = self._tables.values() if model is None else [self._tables.get(model._meta.db_table)]
+        for table in tables:
+            if table is not None:
+                table.clear()
+
+    def stats(self) -> dict:
+        return {name: len(table) for name, table in self._tables.items()}
+
+
+ref_cache = RefCache()
@@ -0,0 +1,73 @@
+from datetime import date
+from typing import List, Optional
+
+from tortoise import Tortoise
+
+from models import Contractor, Currency, InvoiceTotal, Status, VatTaxType
+from refcache import ref_cache
+
+
+# Измерение отчёта -> (колонка invoice_totals, справочник, ключ, поле в ответе)
+REPORT_DIMENSIONS = {
+    "month": ("month", None, None, "month"),
+    "contractor": ("contractor_id", Contractor, "pin", "contractorPin"),
+    "status": ("status_id", Status, "code", "status"),
+    "currency": ("currency_id", Currency, "code", "currency"),
+    "vatTaxType": ("vatTaxType_id", VatTaxType, "code", "vatTaxType"),
+}
+
+
+def month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+async def invoice_totals(group_by: List[str], filters: dict, dateFrom: Optional[date], dateTo: Optional[date]) -> List[dict]:
+    """
+    Итоги из сводной таблицы: стоимость зависит от числа групп,
+    а не от числа документов. Даты округляются до месяца.
+    """
+    conditions, values = [], []
+    # Коды и ПИН переводим в id через кэш справочников, чтобы не делать JOIN
+    for name, value in filters.items():
+        if value is None:
+            continue
+        column, model, key, _ = REPORT_DIMENSIONS[name]
+        ref_id = await ref_cache.get_id(model, key, value)
+        if ref_id is None:
+            return []
+        values.append(ref_id)
+        conditions.append(f'"{column}" = ${len(values)}')
+    if dateFrom is not None:
+        values.append(month_start(dateFrom))
+        conditions.append(f'"month" >= ${len(values)}')
+    if dateTo is not None:
+        values.append(month_start(dateTo))
+        conditions.append(f'"month" <= ${len(values)}')
+
+    columns = [f'"{REPORT_DIMENSIONS[name][0]}"' for name in group_by]
+    select = ", ".join([*columns, 'sum("count") AS "count"', 'sum("totalAmount") AS "totalAmount"'])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    grouping = f"GROUP BY {', '.join(columns)}" if columns else ""
+    ordering = f"ORDER BY {', '.join(columns)}" if columns else ""
+    rows = await Tortoise.get_connection("default").execute_query_dict(
+        f"""
+        SELECT {select} FROM "{InvoiceTotal._meta.db_table}"
+        {where} {grouping}
+        HAVING sum("count") <> 0
+        {ordering}
+        """,
+        values,
+    )
+
+    result = []
+    for row in rows:
+        item = {"count": row["count"], "totalAmount": row["totalAmount"]}
+        for name in group_by:
+            column, model, key, field = REPORT_DIMENSIONS[name]
+            if model is None:
+                item[field] = row[column]
+            else:
+                ref = await ref_cache.get_by_id(model, key, row[column])
+                item[field] = ref[key] if ref is not None else None
+        result.append(item)
+    return result
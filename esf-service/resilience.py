@@ -0,0 +1,100 @@
+import random
+import time
+from typing import Optional
+
+
+class CircuitBreaker:
+    """
+    Автомат closed -> open -> half_open для одной операции ГНС.
+
+    После `failure_threshold` ошибок подряд запросы сразу отклоняются
+    `reset_timeout` секунд, затем пропускается один пробный запрос.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.counters = {"requests": 0, "successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.counters["rejected"] += 1
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._trial_in_flight:
+                self.counters["rejected"] += 1
+                return False
+            self._trial_in_flight = True
+        self.counters["requests"] += 1
+        return True
+
+    def retry_after(self) -> int:
+        if self.state != "open":
+            return 1
+        return max(1, int(self.reset_timeout - (time.monotonic() - self.opened_at)) + 1)
+
+    def record_success(self):
+        self.counters["successes"] += 1
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+        self.state = "closed"
+
+    def record_failure(self):
+        self.counters["failures"] += 1
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.counters["opened"] += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Запрос прерван без результата: пробный слот снова свободен."""
+        self._trial_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutiveFailures": self.consecutive_failures,
+            "retryAfter": self.retry_after() if self.state == "open" else None,
+            **self.counters,
+        }
+
+
+class RetryBudget:
+    """
+    Повторы не больше `ratio` от числа запросов (плюс небольшой запас),
+    чтобы при деградации ГНС повторы не умножали нагрузку.
+    """
+
+    def __init__(self, ratio: float, reserve: float):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = reserve
+        self.counters = {"granted": 0, "denied": 0}
+
+    def deposit(self):
+        self.tokens = min(self.reserve, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.counters["granted"] += 1
+            return True
+        self.counters["denied"] += 1
+        return False
+
+    def snapshot(self) -> dict:
+        return {"tokens": round(self.tokens, 2), **self.counters}
+
+
+def jittered_backoff(attempt: int, base: float, cap: float) -> float:
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -1,9 +1,9 @@
 from uuid import UUID
 from fastapi import FastAPI
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, List, Optional
 from decimal import Decimal
-from datetime import date
+from datetime import date, datetime
 
 # --- Определяем модели данных с помощью Pydantic ---
 
@@ -71,6 +71,23 @@ class ApiResponse(BaseModel):
     responseId: str
     documentUuid: str
 
+class BatchItemError(BaseModel):
+    status_code: int
+    detail: str
+
+class BatchItemResult(BaseModel):
+    index: int
+    response: Optional[ApiResponse] = None
+    # Документ принят ГНС, но ответ не совпал с ApiResponse: тело как есть
+    raw: Optional[Any] = None
+    error: Optional[BatchItemError] = None
+
+class BatchResult(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    items: List[BatchItemResult]
+
 class CodeName(BaseModel):
     code: Optional[str]
     name: Optional[str]
@@ -127,8 +144,24 @@ class InvoiceOut(BaseModel):
     deliveryDate: Optional[date]
     note: Optional[str]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class InvoicesPage(BaseModel):
+    items: List[InvoiceOut]
+    nextCursor: Optional[str] = None
+
+class InvoiceSearchHit(InvoiceOut):
+    invoiceDate: Optional[date]
+    invoiceNumber: Optional[str]
+    number: Optional[str]
+    ownedCrmReceiptCode: Optional[str]
+    contractorName: Optional[str]
+    legalPersonName: Optional[str]
+    score: float
+
+class InvoiceSearchPage(BaseModel):
+    items: List[InvoiceSearchHit]
+    nextOffset: Optional[int] = None
 
 class InvoiceDetailOut(BaseModel):
     id: int
@@ -153,5 +186,27 @@ class InvoiceDetailOut(BaseModel):
     contractor: Optional[ContractorSchema]
     vatTaxType: Optional[VatTaxTypeSchema]
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class InvoiceTotalRow(BaseModel):
+    month: Optional[date] = None
+    contractorPin: Optional[str] = None
+    status: Optional[str] = None
+    currency: Optional[str] = None
+    vatTaxType: Optional[str] = None
+    count: int
+    totalAmount: Decimal
+
+class InvoiceTotalsReport(BaseModel):
+    groupBy: List[str]
+    rows: List[InvoiceTotalRow]
+
+class SubmissionOut(BaseModel):
+    jobId: UUID
+    operation: str
+    status: str
+    attempts: int
+    lastError: Optional[str] = None
+    response: Optional[dict] = None
+    createdAt: datetime
+    updatedAt: datetime
@@ -0,0 +1,123 @@
+import os
+from functools import lru_cache
+from typing import List
+
+from asyncpg.exceptions import QueryCanceledError
+from fastapi import HTTPException
+from tortoise.exceptions import OperationalError
+from tortoise.transactions import in_transaction
+
+from models import Contractor, Invoice, LegalPerson
+
+
+# Бюджет одного поиска: таймаут запроса в БД и потолок выдачи (offset + limit)
+SEARCH_TIMEOUT_MS = int(os.getenv("SEARCH_TIMEOUT_MS", "250"))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "200"))
+# Сколько совпадений ILIKE просматривается в каждом источнике: similarity() считается
+# и сортируется только по ним, иначе частая подстрока («ОсОО») ранжирует всю таблицу
+SEARCH_SCAN_LIMIT = int(os.getenv("SEARCH_SCAN_LIMIT", "5000"))
+# Сколько лучших совпадений берётся из каждого источника до общего ранжирования
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "1000"))
+# Для найденного контрагента или юрлица: сколько лучших по названию
+# и сколько последних документов каждого
+SEARCH_PARTIES = int(os.getenv("SEARCH_PARTIES", "100"))
+SEARCH_PARTY_INVOICES = int(os.getenv("SEARCH_PARTY_INVOICES", "10"))
+# Короче трёх символов триграммный индекс не помогает
+SEARCH_MIN_LENGTH = 3
+
+NUMBER_COLUMNS = ("invoiceNumber", "number", "ownedCrmReceiptCode")
+HIT_COLUMNS = ("id", "documentUuid", "totalAmount", "createdDate", "deliveryDate", "invoiceDate", "note", *NUMBER_COLUMNS)
+
+
+def like_pattern(q: str) -> str:
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _party_hits(model, column: str) -> str:
+    # Лучшие по названию контрагенты/юрлица и их последние документы:
+    # не больше SEARCH_PARTIES × SEARCH_PARTY_INVOICES строк, из них SEARCH_CANDIDATES лучших
+    return f"""(
+        SELECT i."id", p."score" FROM (
+            SELECT "id", word_similarity($1, "fullName") AS "score"
+            FROM (
+                SELECT "id", "fullName" FROM "{model._meta.db_table}"
+                WHERE "fullName" ILIKE $2
+                LIMIT $6
+            ) AS matched
+            ORDER BY "score" DESC, "id" DESC
+            LIMIT $7
+        ) AS p
+        CROSS JOIN LATERAL (
+            SELECT "id" FROM "{Invoice._meta.db_table}"
+            WHERE "{column}" = p."id"
+            ORDER BY "invoiceDate" DESC, "id" DESC
+            LIMIT $8
+        ) AS i
+        ORDER BY "score" DESC, "id" DESC
+        LIMIT $3
+    )"""
+
+
+@lru_cache(maxsize=None)
+def search_sql() -> str:
+    # Строится при первом поиске: имена таблиц без Meta.table Tortoise задаёт только в init
+    return f"""
+        WITH numbers AS (
+            SELECT "id", GREATEST({", ".join(f'similarity("{column}", $1)' for column in NUMBER_COLUMNS)}) AS "score"
+            FROM (
+                SELECT "id", {", ".join(f'"{column}"' for column in NUMBER_COLUMNS)}
+                FROM "{Invoice._meta.db_table}"
+                WHERE {" OR ".join(f'"{column}" ILIKE $2' for column in NUMBER_COLUMNS)}
+                LIMIT $6
+            ) AS matched
+            -- Ранжируем просмотренные совпадения: в кандидаты идут лучшие из них, а не первые попавшиеся
+            ORDER BY "score" DESC, "id" DESC
+            LIMIT $3
+        ),
+        candidates AS (
+            SELECT "id", "score" FROM numbers
+            UNION ALL {_party_hits(Contractor, "contractor_id")}
+            UNION ALL {_party_hits(LegalPerson, "legalPerson_id")}
+        ),
+        ranked AS (
+            SELECT "id", max("score") AS "score" FROM candidates
+            GROUP BY "id"
+            ORDER BY "score" DESC, "id" DESC
+            LIMIT $4 OFFSET $5
+        )
+        SELECT {", ".join(f'i."{column}"' for column in HIT_COLUMNS)},
+               c."fullName" AS "contractorName", l."fullName" AS "legalPersonName", r."score"
+        FROM ranked AS r
+        JOIN "{Invoice._meta.db_table}" AS i ON i."id" = r."id"
+        LEFT JOIN "{Contractor._meta.db_table}" AS c ON c."id" = i."contractor_id"
+        LEFT JOIN "{LegalPerson._meta.db_table}" AS l ON l."id" = i."legalPerson_id"
+        ORDER BY r."score" DESC, r."id" DESC
+    """
+
+
+async def search_invoices(q: str, limit: int, offset: int) -> List[dict]:
+    """
+    Документы, у которых номер, номер ЭСФ или код CRM содержит `q`,
+    а также последние документы контрагентов и юрлиц с `q` в названии.
+
+    Сортировка по триграммной близости. В каждом источнике ранжируются
+    не больше SEARCH_SCAN_LIMIT совпадений ILIKE, и он даёт не больше
+    SEARCH_CANDIDATES лучших; у контрагента или юрлица берутся
+    SEARCH_PARTY_INVOICES его последних документов.
+    """
+    try:
+        async with in_transaction() as connection:
+            await connection.execute_query(f"SET LOCAL statement_timeout = {SEARCH_TIMEOUT_MS}")
+            return await connection.execute_query_dict(
+                search_sql(),
+                [
+                    q, like_pattern(q), SEARCH_CANDIDATES, limit, offset,
+                    SEARCH_SCAN_LIMIT, SEARCH_PARTIES, SEARCH_PARTY_INVOICES,
+                ],
+            )
+    except (QueryCanceledError, OperationalError) as exc:
+        # Внутри транзакции asyncpg отдаёт ошибку как есть, вне её Tortoise оборачивает
+        if "statement timeout" not in str(exc):
+            raise
+        raise HTTPException(status_code=503, detail="Поиск не уложился в отведённое время, уточните запрос")
@@ -0,0 +1,426 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from detailcache import detail_cache
+from gns_client import TIN, gns_client
+from ingest import ingest_page
+from metrics import stage
+from models import PageSync, SyncState
+from schemas import InvoicesResponse
+
+
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "100"))
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "4"))
+# Период фоновой инкрементальной синхронизации в секундах; 0 — выключена
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "0"))
+# Сколько дней до водяного знака перечитывать: документы за последний день
+# могли появиться уже после прошлого прохода
+SYNC_OVERLAP_DAYS = int(os.getenv("SYNC_OVERLAP_DAYS", "1"))
+# Аренда продлевается, пока синхронизация идёт; если воркер упал, её заберёт другой
+SYNC_LEASE_SECONDS = float(os.getenv("SYNC_LEASE_SECONDS", "300"))
+# Водяной знак — это createdDate, поэтому инкрементальная синхронизация не видит
+# смену статуса или суммы у документов старше водяного знака минус SYNC_OVERLAP_DAYS
+# (а с ними и изменений в invoice_totals). Планировщик раз в SYNC_FULL_INTERVAL секунд
+# делает вместо неё полную; 0 — только инкрементальные
+SYNC_FULL_INTERVAL = float(os.getenv("SYNC_FULL_INTERVAL", str(24 * 60 * 60)))
+
+# Водяной знак и аренда ведутся по ИНН, от имени которого ходим в ГНС
+SYNC_KEY = TIN or "default"
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+COUNTERS = ("saved", "inserted", "updated", "unchanged")
+
+
+# /get_invoices/: аренда загрузки страницы (дольше загрузки из ГНС со всеми повторами),
+# сколько ждать загрузку, идущую в другом воркере, и сколько хранить её результат
+PAGE_SYNC_LEASE_SECONDS = float(os.getenv("PAGE_SYNC_LEASE_SECONDS", "120"))
+PAGE_SYNC_WAIT = float(os.getenv("PAGE_SYNC_WAIT", "30"))
+PAGE_SYNC_RESULT_TTL = float(os.getenv("PAGE_SYNC_RESULT_TTL", "600"))
+PAGE_SYNC_POLL_INTERVAL = 0.2
+
+
+# Состояние последней синхронизации в этом воркере
+progress = {"state": "idle"}
+_task: Optional[asyncio.Task] = None
+_scheduler: Optional[asyncio.Task] = None
+_pruner: Optional[asyncio.Task] = None
+# Загрузки одной страницы, идущие в этом воркере: ключ -> задача
+_page_tasks: dict = {}
+
+
+async def fetch_page(
+    documentUuid: Optional[str] = None,
+    page: Optional[int] = None,
+    size: Optional[int] = None,
+    since: Optional[date] = None,
+) -> InvoicesResponse:
+    with stage("sync", "fetch"):
+        response = await gns_client.get_invoices(documentUuid, page=page, size=size, since=since)
+    # Валидация прямо из байтов, без промежуточного dict
+    with stage("sync", "parse"):
+        return InvoicesResponse.model_validate_json(response.content)
+
+
+async def write_page(parsed: InvoicesResponse) -> dict:
+    with stage("sync", "write"):
+        async with in_transaction() as connection:
+            counts = await ingest_page(connection, parsed.invoices)
+    # После коммита, иначе кэш может успеть заполниться старой версией
+    detail_cache.invalidate(counts.pop("ids"))
+    return counts
+
+
+def page_key(documentUuid: Optional[str]) -> str:
+    key = f"page:{documentUuid or '*'}"
+    # Ключ page_sync ограничен 64 символами; UUID в него помещается
+    if len(key) > 64:
+        key = "page:" + hashlib.blake2b(documentUuid.encode(), digest_size=16).hexdigest()
+    return key
+
+
+async def _claim_page(key: str, started) -> Optional[dict]:
+    """
+    Берёт аренду загрузки страницы: None — аренда наша.
+    Иначе {"result": ...}, если страница записана после `started`,
+    или {"result": None}, пока её загружает другой воркер.
+    """
+    table = PageSync._meta.db_table
+    connection = Tortoise.get_connection("default")
+    rows = await connection.execute_query_dict(
+        f'SELECT "result"::text AS "result" FROM "{table}" WHERE "key" = $1 AND "finishedAt" >= $2',
+        [key, started],
+    )
+    if rows:
+        return {"result": json.loads(rows[0]["result"])}
+    claimed = await connection.execute_query_dict(
+        f"""
+        INSERT INTO "{table}" ("key", "lockedBy", "lockedUntil")
+        VALUES ($1, $2, now() + make_interval(secs => $3))
+        ON CONFLICT ("key") DO UPDATE
+        SET "lockedBy" = EXCLUDED."lockedBy", "lockedUntil" = EXCLUDED."lockedUntil"
+        WHERE "{table}"."lockedUntil" IS NULL OR "{table}"."lockedUntil" < now()
+        RETURNING "key"
+        """,
+        [key, WORKER_ID, PAGE_SYNC_LEASE_SECONDS],
+    )
+    return None if claimed else {"result": None}
+
+
+async def _release_page(key: str):
+    await Tortoise.get_connection("default").execute_query(
+        f"""
+        UPDATE "{PageSync._meta.db_table}" SET "lockedBy" = NULL, "lockedUntil" = NULL
+        WHERE "key" = $1 AND "lockedBy" = $2
+        """,
+        [key, WORKER_ID],
+    )
+
+
+async def _sync_page(key: str, documentUuid: Optional[str]) -> dict:
+    """
+    Загрузка и запись одной страницы под арендой в page_sync.
+
+    Пока аренду держит другой воркер, запрос ждёт до PAGE_SYNC_WAIT секунд
+    и берёт его результат, если страница записана уже после начала ожидания;
+    не дождался — 503. Загрузка из ГНС идёт без соединения с БД,
+    транзакция открыта только на запись документов и результата.
+    """
+    rows = await Tortoise.get_connection("default").execute_query_dict('SELECT clock_timestamp() AS "now"')
+    started = rows[0]["now"]
+    deadline = time.monotonic() + PAGE_SYNC_WAIT
+    while True:
+        shared = await _claim_page(key, started)
+        if shared is None:
+            break
+        if shared["result"] is not None:
+            return shared["result"]
+        if time.monotonic() > deadline:
+            raise HTTPException(
+                status_code=503,
+                detail="Эту страницу ГНС уже загружает другой воркер, повторите запрос позже",
+                headers={"Retry-After": str(int(PAGE_SYNC_WAIT))},
+            )
+        await asyncio.sleep(PAGE_SYNC_POLL_INTERVAL)
+
+    try:
+        parsed = await fetch_page(documentUuid)
+        try:
+            with stage("sync", "write"):
+                async with in_transaction() as connection:
+                    counts = await ingest_page(connection, parsed.invoices)
+                    ids = counts.pop("ids")
+                    # Результат и снятие аренды — в той же транзакции, что и документы
+                    await connection.execute_query(
+                        f"""
+                        UPDATE "{PageSync._meta.db_table}"
+                        SET "lockedBy" = NULL, "lockedUntil" = NULL,
+                            "finishedAt" = clock_timestamp(), "result" = $3::jsonb
+                        WHERE "key" = $1 AND "lockedBy" = $2
+                        """,
+                        [key, WORKER_ID, json.dumps(counts)],
+                    )
+        except Exception as exc:
+            print(f"Ошибка записи страницы ГНС {key}: {exc!r}")
+            raise HTTPException(status_code=500, detail="Ошибка при сохранении документов")
+    except BaseException:
+        # Ожидающие воркеры заберут аренду сразу, не дожидаясь её истечения
+        try:
+            await asyncio.shield(_release_page(key))
+        except Exception as exc:
+            print(f"Ошибка снятия аренды страницы ГНС {key}: {exc!r}")
+        raise
+    detail_cache.invalidate(ids)
+    return counts
+
+
+async def prune_page_results() -> int:
+    """Удаляет устаревшие результаты /get_invoices/ и брошенные аренды."""
+    deleted, _ = await Tortoise.get_connection("default").execute_query(
+        f"""DELETE FROM "{PageSync._meta.db_table}"
+        WHERE ("lockedUntil" IS NULL OR "lockedUntil" < now())
+          AND ("finishedAt" IS NULL OR "finishedAt" < now() - make_interval(secs => $1))""",
+        [PAGE_SYNC_RESULT_TTL],
+    )
+    return deleted
+
+
+async def sync_page(documentUuid: Optional[str] = None) -> dict:
+    """
+    Одна страница ГНС с записью в БД для /get_invoices/.
+
+    Одновременные запросы с тем же `documentUuid` в воркере ждут одну
+    загрузку и получают её результат. Загрузка идёт отдельной задачей:
+    отключение первого клиента не прерывает её для остальных.
+    """
+    key = page_key(documentUuid)
+    task = _page_tasks.get(key)
+    if task is None:
+        task = asyncio.create_task(_sync_page(key, documentUuid))
+        _page_tasks[key] = task
+        task.add_done_callback(lambda _: _page_tasks.pop(key, None))
+    return dict(await asyncio.shield(task))
+
+
+def _apply(state: dict, parsed: InvoicesResponse, counts: dict):
+    state["pagesDone"] += 1
+    for key in COUNTERS:
+        state[key] += counts[key]
+    created = [inv.createdDate.isoformat() for inv in parsed.invoices if inv.createdDate is not None]
+    if created and (state.get("watermark") is None or max(created) > state["watermark"]):
+        state["watermark"] = max(created)
+
+
+async def sync_all_pages(
+    documentUuid: Optional[str] = None,
+    page_size: int = SYNC_PAGE_SIZE,
+    concurrency: int = SYNC_CONCURRENCY,
+    state: Optional[dict] = None,
+    since: Optional[date] = None,
+) -> dict:
+    """
+    Проходит все страницы ГНС.
+
+    Первая страница даёт `totalPage`, остальные качают `concurrency`
+    воркеров. Записью в БД занимается одна корутина: пока пишется
+    страница N, следующие уже загружаются. Очередь ограничена,
+    поэтому в памяти не больше `concurrency` несохранённых страниц.
+    Каждая страница пишется в своей транзакции.
+    С `since` запрашиваются только документы, созданные начиная с этой даты.
+    """
+    state = state if state is not None else {}
+    state.update(pagesDone=0, watermark=None, **dict.fromkeys(COUNTERS, 0))
+
+    first = await fetch_page(documentUuid, 0, page_size, since)
+    state.update(totalPage=first.totalPage, totalElements=first.totalElements)
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    pages = iter(range(1, first.totalPage))
+
+    async def fetcher():
+        # Итератор общий: каждый воркер берёт следующий ещё не взятый номер
+        for page in pages:
+            try:
+                item = await fetch_page(documentUuid, page, page_size, since)
+            except Exception as exc:
+                item = exc
+            await queue.put(item)
+            if isinstance(item, Exception):
+                return
+
+    workers = [asyncio.create_task(fetcher()) for _ in range(min(concurrency, max(first.totalPage - 1, 0)))]
+    try:
+        _apply(state, first, await write_page(first))
+        for _ in range(first.totalPage - 1):
+            item = await queue.get()
+            if isinstance(item, Exception):
+                raise item
+            _apply(state, item, await write_page(item))
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    return state
+
+
+async def acquire_lease() -> Optional[dict]:
+    """
+    Берёт аренду синхронизации; None, если её держит другой воркер.
+    `fullDue` — прошло ли SYNC_FULL_INTERVAL с последней полной синхронизации.
+    """
+    table = SyncState._meta.db_table
+    rows = await Tortoise.get_connection("default").execute_query_dict(
+        f"""
+        INSERT INTO "{table}" ("key", "lockedBy", "lockedUntil")
+        VALUES ($1, $2, now() + make_interval(secs => $3))
+        ON CONFLICT ("key") DO UPDATE
+        SET "lockedBy" = EXCLUDED."lockedBy", "lockedUntil" = EXCLUDED."lockedUntil"
+        WHERE "{table}"."lockedUntil" IS NULL OR "{table}"."lockedUntil" < now()
+        RETURNING "watermark",
+            "lastFullSyncAt" IS NULL OR "lastFullSyncAt" < now() - make_interval(secs => $4) AS "fullDue"
+        """,
+        [SYNC_KEY, WORKER_ID, SYNC_LEASE_SECONDS, SYNC_FULL_INTERVAL],
+    )
+    return rows[0] if rows else None
+
+
+async def _renew_lease():
+    while True:
+        await asyncio.sleep(SYNC_LEASE_SECONDS / 3)
+        try:
+            await Tortoise.get_connection("default").execute_query(
+                f"""
+                UPDATE "{SyncState._meta.db_table}"
+                SET "lockedUntil" = now() + make_interval(secs => $3)
+                WHERE "key" = $1 AND "lockedBy" = $2
+                """,
+                [SYNC_KEY, WORKER_ID, SYNC_LEASE_SECONDS],
+            )
+        except Exception as exc:
+            print(f"Ошибка продления аренды синхронизации: {exc}")
+
+
+async def release_lease(watermark: Optional[date], result: dict, full: bool = False):
+    """
+    Снимает аренду и сдвигает водяной знак вперёд (назад он не уходит).
+    `full` — завершилась полная синхронизация всех документов.
+    """
+    await Tortoise.get_connection("default").execute_query(
+        f"""
+        UPDATE "{SyncState._meta.db_table}"
+        SET "lockedBy" = NULL, "lockedUntil" = NULL, "lastSyncAt" = now(),
+            "lastResult" = $3::jsonb, "watermark" = GREATEST("watermark", $4::date),
+            "lastFullSyncAt" = CASE WHEN $5 THEN now() ELSE "lastFullSyncAt" END
+        WHERE "key" = $1 AND "lockedBy" = $2
+        """,
+        [SYNC_KEY, WORKER_ID, json.dumps(result, default=str), watermark, full],
+    )
+
+
+async def _run(documentUuid: Optional[str], incremental: bool, scheduled: bool = False):
+    try:
+        lease = await acquire_lease()
+    except Exception as exc:
+        progress.update(state="failed", error=str(exc), finishedAt=datetime.utcnow().isoformat())
+        return
+    if lease is None:
+        progress.update(state="skipped", error="Синхронизация уже выполняется другим воркером")
+        return
+
+    if scheduled and SYNC_FULL_INTERVAL > 0 and lease["fullDue"]:
+        incremental = False
+        progress["mode"] = "full"
+
+    heartbeat = asyncio.create_task(_renew_lease())
+    watermark = None
+    full = False
+    try:
+        if incremental and lease["watermark"] is not None:
+            since = lease["watermark"] - timedelta(days=SYNC_OVERLAP_DAYS)
+            progress["since"] = since.isoformat()
+        else:
+            since = None
+        await sync_all_pages(documentUuid, state=progress, since=since)
+        progress["state"] = "done"
+        # Водяной знак относится ко всему набору документов, не к выборке по documentUuid
+        if documentUuid is None and progress.get("watermark"):
+            watermark = date.fromisoformat(progress["watermark"])
+        full = documentUuid is None and not incremental
+    except asyncio.CancelledError:
+        progress["state"] = "cancelled"
+        raise
+    except Exception as exc:
+        progress.update(state="failed", error=str(getattr(exc, "detail", exc)))
+    finally:
+        heartbeat.cancel()
+        progress["finishedAt"] = datetime.utcnow().isoformat()
+        try:
+            await release_lease(watermark, progress, full)
+        except Exception as exc:
+            print(f"Ошибка снятия аренды синхронизации: {exc}")
+
+
+def start_sync(documentUuid: Optional[str] = None, incremental: bool = False, scheduled: bool = False) -> dict:
+    """
+    Запускает синхронизацию в фоне, если она ещё не идёт в этом воркере.
+    Инкрементальная качает только документы новее водяного знака и не видит
+    изменений старых документов; для `scheduled` запусков она заменяется
+    полной, если последняя полная была раньше SYNC_FULL_INTERVAL.
+    """
+    global _task
+    if _task is not None and not _task.done():
+        return progress
+    progress.clear()
+    progress.update(
+        state="running",
+        mode="incremental" if incremental else "full",
+        documentUuid=documentUuid,
+        startedAt=datetime.utcnow().isoformat(),
+        pagesDone=0,
+        **dict.fromkeys(COUNTERS, 0),
+    )
+    _task = asyncio.create_task(_run(documentUuid, incremental, scheduled))
+    return progress
+
+
+async def _schedule():
+    while True:
+        # Разброс, чтобы воркеры, запущенные вместе, не ломились за арендой одновременно
+        await asyncio.sleep(SYNC_INTERVAL * random.uniform(0.9, 1.1))
+        start_sync(incremental=True, scheduled=True)
+
+
+async def _prune():
+    while True:
+        await asyncio.sleep(PAGE_SYNC_RESULT_TTL)
+        try:
+            await prune_page_results()
+        except Exception as exc:
+            print(f"Ошибка очистки page_sync: {exc}")
+
+
+def start_scheduler():
+    global _scheduler, _pruner
+    if SYNC_INTERVAL > 0 and _scheduler is None:
+        _scheduler = asyncio.create_task(_schedule())
+    if _pruner is None:
+        _pruner = asyncio.create_task(_prune())
+
+
+async def stop_scheduler():
+    global _scheduler, _pruner
+    tasks = [task for task in (_scheduler, _pruner, _task) if task is not None and not task.done()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _scheduler = None
+    _pruner = None
@@ -0,0 +1,116 @@
+import asyncio
+import math
+import os
+import random
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+
+
+def _env(name: str, operation: Optional[str], default: str) -> str:
+    # Общая настройка и переопределение на операцию: GNS_LATENCY / GNS_LATENCY_GET
+    if operation:
+        value = os.getenv(f"{name}_{operation.upper()}")
+        if value is not None:
+            return value
+    return os.getenv(name, default)
+
+
+OPERATIONS = ("get", "create", "update", "delete")
+
+
+def load_config() -> dict:
+    return {
+        "latency": {op: _env("GNS_LATENCY", op, "none") for op in OPERATIONS},
+        "errorRate": {op: float(_env("GNS_ERROR_RATE", op, "0")) for op in OPERATIONS},
+        "timeoutRate": {op: float(_env("GNS_TIMEOUT_RATE", op, "0")) for op in OPERATIONS},
+        # Сколько «зависший» запрос держит соединение перед 504
+        "hangSeconds": float(os.getenv("GNS_HANG_SECONDS", "60")),
+        "errorStatuses": [int(code) for code in os.getenv("GNS_ERROR_STATUSES", "500,502,503").split(",")],
+        # Запросов в секунду на весь сервис; 0 — без ограничения
+        "rateLimit": float(os.getenv("GNS_RATE_LIMIT", "0")),
+        "rateBurst": float(os.getenv("GNS_RATE_BURST", "0")),
+    }
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """
+    Задержка в секундах по описанию распределения (значения в мс):
+    none, fixed:50, uniform:20:200, normal:100:20, exponential:100,
+    lognormal:80:0.5 (медиана и sigma).
+    """
+    kind, *args = spec.split(":")
+    params = [float(arg) for arg in args]
+    if kind == "none":
+        value = 0.0
+    elif kind == "fixed":
+        value = params[0]
+    elif kind == "uniform":
+        value = rng.uniform(params[0], params[1])
+    elif kind == "normal":
+        value = rng.gauss(params[0], params[1])
+    elif kind == "exponential":
+        value = rng.expovariate(1 / params[0])
+    elif kind == "lognormal":
+        value = rng.lognormvariate(math.log(params[0]), params[1])
+    else:
+        raise ValueError(f"Неизвестное распределение задержки: {spec}")
+    return max(0.0, value) / 1000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(burst, rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> Optional[float]:
+        """None, если запрос пропущен, иначе через сколько секунд появится токен."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return None
+        return (1 - self.tokens) / self.rate
+
+
+class Chaos:
+    """Задержки, ошибки, зависания и ограничение частоты для запросов к заглушке."""
+
+    def __init__(self, config: dict, seed: int):
+        self.rng = random.Random(seed)
+        self.stats = {op: {"requests": 0, "errors": 0, "timeouts": 0, "rateLimited": 0} for op in OPERATIONS}
+        self.configure(config)
+
+    def configure(self, config: dict):
+        for op, spec in config["latency"].items():
+            sample_latency(spec, self.rng)
+        self.config = config
+        self.bucket = TokenBucket(config["rateLimit"], config["rateBurst"]) if config["rateLimit"] > 0 else None
+
+    async def apply(self, operation: str):
+        stats = self.stats[operation]
+        stats["requests"] += 1
+        if self.bucket is not None:
+            wait = self.bucket.take()
+            if wait is not None:
+                stats["rateLimited"] += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Превышен лимит запросов",
+                    headers={"Retry-After": str(max(1, math.ceil(wait)))},
+                )
+
+        await asyncio.sleep(sample_latency(self.config["latency"][operation], self.rng))
+
+        roll = self.rng.random()
+        if roll < self.config["timeoutRate"][operation]:
+            stats["timeouts"] += 1
+            await asyncio.sleep(self.config["hangSeconds"])
+            raise HTTPException(status_code=504, detail="Имитация зависшего запроса")
+        if roll < self.config["timeoutRate"][operation] + self.config["errorRate"][operation]:
+            stats["errors"] += 1
+            raise HTTPException(status_code=self.rng.choice(self.config["errorStatuses"]), detail="Имитация ошибки ГНС")
@@ -0,0 +1,86 @@
+import os
+import random
+import uuid
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Optional
+
+
+# Организация, от имени которой «выписаны» документы
+DATASET_TIN = os.getenv("GNS_DATASET_TIN", "01234567890123")
+DATASET_START = date.fromisoformat(os.getenv("GNS_DATASET_START", "2024-01-01"))
+DATASET_DAYS = int(os.getenv("GNS_DATASET_DAYS", "365"))
+CONTRACTORS = int(os.getenv("GNS_DATASET_CONTRACTORS", "200"))
+
+PAYMENT_TYPES = [("1", "Наличный расчёт"), ("2", "Безналичный расчёт")]
+CURRENCIES = [("417", "KGS"), ("840", "USD"), ("643", "RUB")]
+STATUSES = [("10", "Черновик"), ("20", "Отправлен"), ("30", "Принят"), ("40", "Отклонён")]
+RECEIPT_TYPES = [("1", "Основной"), ("2", "Корректировочный")]
+DELIVERY_TYPES = [("1", "Поставка товаров"), ("2", "Оказание услуг")]
+VAT_TAX_TYPES = [("12", "12.00", "НДС 12%"), ("0", "0.00", "Без НДС")]
+
+
+def _code_name(pair) -> dict:
+    return {"code": pair[0], "name": pair[1]}
+
+
+def make_invoice(index: int, size: int, seed: int) -> dict:
+    """Документ №index: при тех же size и seed всегда один и тот же."""
+    rng = random.Random(seed * 1_000_003 + index)
+    created = DATASET_START + timedelta(days=index * DATASET_DAYS // max(size, 1))
+    contractor = rng.randrange(CONTRACTORS)
+    vat = rng.choice(VAT_TAX_TYPES)
+    return {
+        "documentUuid": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "totalAmount": round(rng.uniform(100, 500_000), 2),
+        "createdDate": created.isoformat(),
+        "deliveryDate": (created + timedelta(days=rng.randrange(6))).isoformat(),
+        "invoiceDate": created.isoformat(),
+        "ownedCrmReceiptCode": f"CRM-{index:08d}",
+        "invoiceNumber": f"ЭСФ-{created.year}-{index:08d}",
+        "number": f"{index:010d}",
+        "note": "Поставка по договору" if rng.random() < 0.3 else None,
+        "correctedReceiptUuid": None,
+        "isResident": "true" if rng.random() < 0.9 else "false",
+        "paymentType": _code_name(rng.choice(PAYMENT_TYPES)),
+        "currency": _code_name(rng.choice(CURRENCIES)),
+        "status": _code_name(rng.choice(STATUSES)),
+        "receiptType": _code_name(rng.choice(RECEIPT_TYPES)),
+        "deliveryType": _code_name(rng.choice(DELIVERY_TYPES)),
+        "legalPerson": {"pin": DATASET_TIN, "fullName": "ОсОО «Тестовая организация»", "mainFullName": None, "mainPin": None},
+        "contractor": {
+            "pin": f"2{contractor:013d}",
+            "fullName": f"ОсОО «Контрагент {contractor}»",
+            "mainFullName": None,
+            "mainPin": None,
+        },
+        "vatTaxType": {"code": vat[0], "rate": vat[1], "name": vat[2]},
+    }
+
+
+class Dataset:
+    """Синтетические документы, упорядоченные по createdDate."""
+
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        self.seed = seed
+        self.invoices = [make_invoice(i, size, seed) for i in range(size)]
+        self._created = [invoice["createdDate"] for invoice in self.invoices]
+        self._by_uuid = {invoice["documentUuid"]: invoice for invoice in self.invoices}
+
+    def get(self, documentUuid: str) -> Optional[dict]:
+        return self._by_uuid.get(documentUuid)
+
+    def page(self, page: int, size: int, since: Optional[str] = None, documentUuid: Optional[str] = None) -> dict:
+        """Страница в формате InvoicesResponse."""
+        if documentUuid:
+            invoice = self.get(documentUuid)
+            selected = [invoice] if invoice is not None else []
+        else:
+            selected = self.invoices[bisect_left(self._created, since):] if since else self.invoices
+        total = len(selected)
+        return {
+            "invoices": selected[page * size:(page + 1) * size],
+            "totalElements": total,
+            "totalPage": max(1, -(-total // size)),
+        }
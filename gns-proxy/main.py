@@ -1,8 +1,35 @@
-from fastapi import FastAPI, Request
-from pydantic import BaseModel
+import os
+from typing import Optional
 from uuid import uuid4
 
-app = FastAPI(title="GNS Proxy (mock)")
+from fastapi import Body, FastAPI, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+from chaos import Chaos, load_config
+from dataset import Dataset
+from metrics import setup_metrics
+
+app = FastAPI(title="GNS Proxy (mock)", default_response_class=ORJSONResponse)
+setup_metrics(app, instrument_db=False)
+
+# Пути те же, что в настройках esf-service (CREATE_PATH, GET_PATH, ...)
+CREATE_PATH = "/" + os.getenv("CREATE_PATH", "invoices/create").strip("/")
+GET_PATH = "/" + os.getenv("GET_PATH", "invoices").strip("/")
+UPDATE_PATH = "/" + os.getenv("UPDATE_PATH", "invoices/update").strip("/")
+DELETE_PATH = "/" + os.getenv("DELETE_PATH", "invoices/delete").strip("/")
+# Параметры выдачи, как GNS_PAGE_PARAM / GNS_SIZE_PARAM / GNS_SINCE_PARAM в esf-service
+PAGE_PARAM = os.getenv("GNS_PAGE_PARAM", "page")
+SIZE_PARAM = os.getenv("GNS_SIZE_PARAM", "size")
+SINCE_PARAM = os.getenv("GNS_SINCE_PARAM", "createdDateFrom")
+DEFAULT_PAGE_SIZE = int(os.getenv("GNS_DEFAULT_PAGE_SIZE", "100"))
+
+DATASET_SIZE = int(os.getenv("GNS_DATASET_SIZE", "1000"))
+SEED = int(os.getenv("GNS_SEED", "42"))
+
+dataset = Dataset(DATASET_SIZE, SEED)
+chaos = Chaos(load_config(), SEED)
+
 
 class ReceiveModel(BaseModel):
     document_uuid: str
@@ -13,3 +40,83 @@ class ReceiveModel(BaseModel):
 async def receive(doc: ReceiveModel):
     # имитация обработки: возвращаем статус и внутренний id
     return {"status": "accepted", "gns_id": str(uuid4())}
+
+
+@app.get(GET_PATH)
+async def get_invoices(request: Request, exchangeCode: Optional[str] = None):
+    await chaos.apply("get")
+    params = request.query_params
+    try:
+        page = int(params.get(PAGE_PARAM, 0))
+        size = int(params.get(SIZE_PARAM, DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректные параметры страницы")
+    if page < 0 or size < 1:
+        raise HTTPException(status_code=400, detail="Некорректные параметры страницы")
+    return dataset.page(page, size, since=params.get(SINCE_PARAM), documentUuid=exchangeCode)
+
+
+@app.post(CREATE_PATH)
+async def create_invoice(payload: dict = Body(...)):
+    await chaos.apply("create")
+    return {"responseId": str(uuid4()), "documentUuid": str(uuid4())}
+
+
+@app.put(UPDATE_PATH + "/{document_uuid}")
+async def update_invoice(document_uuid: str, payload: dict = Body(...)):
+    await chaos.apply("update")
+    return {"responseId": str(uuid4()), "documentUuid": document_uuid}
+
+
+@app.delete(DELETE_PATH + "/{document_uuid}")
+async def delete_invoice(document_uuid: str):
+    await chaos.apply("delete")
+    return {"status": "deleted", "documentUuid": document_uuid}
+
+
+# --- Управление заглушкой во время нагрузочного прогона ---
+
+@app.get("/_control/config")
+async def get_config():
+    return {**chaos.config, "datasetSize": dataset.size, "seed": dataset.seed}
+
+
+@app.patch("/_control/config")
+async def update_config(changes: dict = Body(...)):
+    """
+    Частичное изменение настроек, например
+    {"latency": {"get": "lognormal:80:0.5"}, "errorRate": {"create": 0.05}, "rateLimit": 50}.
+    """
+    config = {key: dict(value) if isinstance(value, dict) else value for key, value in chaos.config.items()}
+    for key, value in changes.items():
+        if key not in config:
+            raise HTTPException(status_code=400, detail=f"Неизвестная настройка: {key}")
+        if isinstance(config[key], dict):
+            config[key].update(value)
+        else:
+            config[key] = value
+    try:
+        chaos.configure(config)
+    except (ValueError, IndexError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return config
+
+
+@app.post("/_control/dataset")
+async def regenerate_dataset(size: int = Query(DATASET_SIZE, ge=0), seed: int = SEED):
+    global dataset
+    dataset = Dataset(size, seed)
+    return {"datasetSize": dataset.size, "seed": dataset.seed}
+
+
+@app.get("/_control/stats")
+async def get_stats():
+    return chaos.stats
+
+
+@app.post("/_control/stats/reset")
+async def reset_stats():
+    for stats in chaos.stats.values():
+        for key in stats:
+            stats[key] = 0
+    return chaos.stats
@@ -0,0 +1,158 @@
+"""
+Метрики Prometheus: задержки HTTP по маршрутам, запросы к БД,
+вызовы внешних сервисов и этапы конвейеров.
+
+Одинаковый модуль лежит в каждом сервисе: образы собираются
+из каталогов сервисов по отдельности.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Время запроса к БД", ["operation"], buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Запросы к БД, завершившиеся ошибкой", ["operation"])
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "Число запросов к БД на HTTP-запрос",
+    ["route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Суммарное время запросов к БД на HTTP-запрос",
+    ["route"], buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds", "Время вызова внешнего сервиса",
+    ["upstream", "operation", "outcome"], buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "pipeline_stage_duration_seconds", "Время этапа конвейера",
+    ["pipeline", "stage"], buckets=LATENCY_BUCKETS,
+)
+
+# [число запросов, время] к БД в рамках текущего HTTP-запроса
+_db_usage: ContextVar[Optional[list]] = ContextVar("db_usage", default=None)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    # Неизвестные пути сводим в одну метку, чтобы не плодить ряды
+    return route.path if route is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware без BaseHTTPMiddleware: не буферизует тело и почти ничего не стоит."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        usage = [0, 0.0]
+        token = _db_usage.set(usage)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _db_usage.reset(token)
+            route = _route_label(scope)
+            if route != "/metrics":
+                REQUEST_LATENCY.labels(scope["method"], route, status).observe(elapsed)
+                DB_QUERIES_PER_REQUEST.labels(route).observe(usage[0])
+                DB_TIME_PER_REQUEST.labels(route).observe(usage[1])
+
+
+def _observe_query(query: str, elapsed: float, failed: bool):
+    operation = query.lstrip().split(None, 1)[0].upper() if query.strip() else "UNKNOWN"
+    DB_QUERY_LATENCY.labels(operation).observe(elapsed)
+    if failed:
+        DB_QUERY_ERRORS.labels(operation).inc()
+    usage = _db_usage.get()
+    if usage is not None:
+        usage[0] += 1
+        usage[1] += elapsed
+
+
+def _timed(method):
+    async def wrapper(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await method(self, query, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            _observe_query(query, time.perf_counter() - started, failed)
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument_tortoise():
+    """Оборачивает методы выполнения запросов клиента asyncpg в Tortoise."""
+    from tortoise.backends.asyncpg.client import AsyncpgDBClient, TransactionWrapper
+
+    for cls in (AsyncpgDBClient, TransactionWrapper):
+        for name in ("execute_insert", "execute_many", "execute_query", "execute_query_dict", "execute_script"):
+            method = vars(cls).get(name)
+            if method is not None and not getattr(method, "instrumented", False):
+                setattr(cls, name, _timed(method))
+
+
+@contextmanager
+def observe_upstream(upstream: str, operation: str):
+    """
+    Засекает вызов внешнего сервиса. Исход (`ok`, код ошибки и т. п.)
+    можно уточнить через выданный dict: `outcome["value"] = "503"`.
+    """
+    outcome = {"value": "ok"}
+    started = time.perf_counter()
+    try:
+        yield outcome
+    except BaseException as exc:
+        if outcome["value"] == "ok":
+            outcome["value"] = str(getattr(exc, "status_code", type(exc).__name__))
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(upstream, operation, outcome["value"]).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def stage(pipeline: str, name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(pipeline, name).observe(time.perf_counter() - started)
+
+
+def setup_metrics(app: FastAPI, instrument_db: bool = True):
+    app.add_middleware(MetricsMiddleware)
+    if instrument_db:
+        instrument_tortoise()
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)